@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Measure throughput and latency of the send, broadcast and history hot paths.
+
+Runs send_message, broadcast_message at several hook counts, and
+list_messages/list_users at several history sizes against a local stub
+webhook server with configurable latency, in a throwaway database. Each
+scenario reports operations/sec plus p50 and p99 latency. Results can be
+saved with --output and compared against an earlier run with --baseline,
+which exits non-zero when a scenario got slower by more than --tolerance.
+
+Usage: python benchmarks/bench_hot_paths.py [--latency SECONDS] [--quick] [--output FILE] [--baseline FILE]
+"""
+import argparse
+import atexit
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+# disscli reads its paths when it is imported, so point them somewhere
+# disposable first
+WORKDIR = tempfile.mkdtemp(prefix="disscli-bench-")
+atexit.register(shutil.rmtree, WORKDIR, True)
+os.environ.update({
+    "DISSCLI_CONFIG_PATH": os.path.join(WORKDIR, "config.json"),
+    "DISSCLI_DB_PATH": os.path.join(WORKDIR, "history.db"),
+    "DISSCLI_CACHE_PATH": os.path.join(WORKDIR, "cache.json"),
+    "DISSCLI_SOCKET_PATH": os.path.join(WORKDIR, "diss.sock"),
+    "DISSCLI_ARCHIVE_DIR": os.path.join(WORKDIR, "archive"),
+})
+
+from stub_server import StubWebhookServer  # noqa: E402
+from disscli import main as cli  # noqa: E402
+
+USERS = [f"@user{i}" for i in range(50)]
+
+
+def percentile(timings, fraction):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+def summarize(timings, operations):
+    # operations is how many messages (or rows) the timed calls handled in
+    # total, so throughput stays comparable between scenarios
+    total = sum(timings)
+    return {
+        "calls": len(timings),
+        "per_sec": operations / total if total else 0.0,
+        "p50_ms": percentile(timings, 0.5) * 1000,
+        "p99_ms": percentile(timings, 0.99) * 1000,
+    }
+
+
+def timed(func, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def fresh_database(name):
+    # A new history database per scenario, so sizes don't leak between them
+    cli.DB_PATH = os.path.join(WORKDIR, f"{name}.db")
+    cli.init_db(quiet=True)
+
+
+def bench_send(server, messages):
+    fresh_database("send")
+    url = server.webhook_url()
+    cli.add_hook("bench", url)
+    counter = iter(range(messages))
+    timings = timed(lambda: cli.send_message(url, "bench", None, f"benchmark message {next(counter)}"), messages)
+    return summarize(timings, messages)
+
+
+def bench_broadcast(server, hooks, runs):
+    fresh_database(f"broadcast_{hooks}")
+    for i in range(hooks):
+        cli.add_hook(f"hook{i}", server.webhook_url(hook_id=i))
+    timings = timed(lambda: cli.broadcast_message("benchmark broadcast", "bench", cli.DEFAULT_BROADCAST_CONCURRENCY),
+                    runs)
+    return summarize(timings, hooks * runs)
+
+
+def fill_history(rows):
+    # Every fifth message mentions one of USERS
+    start = time.time() - rows
+    cli.insert_history(
+        (f"history message {i} with some typical text", [USERS[i % len(USERS)]] if i % 5 == 0 else [],
+         start + i, "bench")
+        for i in range(rows)
+    )
+
+
+def bench_history(rows):
+    fresh_database(f"history_{rows}")
+    fill_history(rows)
+    runs = max(3, min(50, 1000000 // rows))
+    results = {}
+    timings = timed(cli.list_messages, runs)
+    results[f"list_messages_{rows}"] = summarize(timings, rows * runs)
+    timings = timed(cli.list_users, runs)
+    results[f"list_users_{rows}"] = summarize(timings, runs)
+    return results
+
+
+def run_benchmarks(latency, messages, broadcast_hooks, broadcast_runs, history_rows):
+    results = {}
+    with StubWebhookServer(latency=latency) as server, contextlib.redirect_stdout(io.StringIO()):
+        results["send"] = bench_send(server, messages)
+        for hooks in broadcast_hooks:
+            results[f"broadcast_{hooks}"] = bench_broadcast(server, hooks, broadcast_runs)
+    # The history scenarios don't touch the network
+    with contextlib.redirect_stdout(io.StringIO()):
+        for rows in history_rows:
+            results.update(bench_history(rows))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for scenario, metrics in results.items():
+        previous = baseline.get(scenario)
+        if not previous:
+            continue
+        if metrics["per_sec"] < previous["per_sec"] * (1 - tolerance):
+            regressions.append(f"{scenario}: {previous['per_sec']:.1f}/s -> {metrics['per_sec']:.1f}/s")
+        if metrics["p99_ms"] > previous["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{scenario}: p99 {previous['p99_ms']:.2f} ms -> {metrics['p99_ms']:.2f} ms")
+    return regressions
+
+
+def int_list(value):
+    return [int(item) for item in value.split(",") if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.0, help="Artificial server latency in seconds")
+    parser.add_argument("--messages", type=int, default=200, help="Messages for the send scenario")
+    parser.add_argument("--hooks", type=int_list, default=[1, 10, 100, 500],
+                        help="Comma-separated hook counts for the broadcast scenarios (defaults to 1,10,100,500)")
+    parser.add_argument("--broadcasts", type=int, default=20, help="Broadcasts per hook count")
+    parser.add_argument("--rows", type=int_list, default=[1000, 10000, 100000, 1000000],
+                        help="Comma-separated history sizes (defaults to 1000,10000,100000,1000000)")
+    parser.add_argument("--quick", action="store_true",
+                        help="Smaller runs for a fast check: 50 messages, up to 100 hooks and 10,000 rows")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results previously written with --output")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slowdown against the baseline as a fraction (defaults to 0.2)")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.messages = min(args.messages, 50)
+        args.hooks = [hooks for hooks in args.hooks if hooks <= 100]
+        args.broadcasts = min(args.broadcasts, 5)
+        args.rows = [rows for rows in args.rows if rows <= 10000]
+
+    results = run_benchmarks(args.latency, args.messages, args.hooks, args.broadcasts, args.rows)
+    print(f"{'scenario':<24} {'per sec':>12} {'p50 ms':>10} {'p99 ms':>10}")
+    for scenario, metrics in results.items():
+        print(f"{scenario:<24} {metrics['per_sec']:12.1f} {metrics['p50_ms']:10.2f} {metrics['p99_ms']:10.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "python": platform.python_version(),
+                    "sqlite": sqlite3.sqlite_version,
+                    "latency": args.latency,
+                },
+                "results": results,
+            }, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        if regressions:
+            print("Regressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
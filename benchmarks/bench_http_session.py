@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Compare per-message latency of one-off requests.post calls against the
+shared keep-alive session used by send_message.
+
+Usage: python benchmarks/bench_http_session.py [--messages N] [--latency SECONDS]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_server import StubWebhookServer  # noqa: E402
+from disscli.main import close_http_session, get_http_session  # noqa: E402
+
+
+def time_posts(post, url, count):
+    timings = []
+    for i in range(count):
+        start = time.perf_counter()
+        response = post(url, json={"content": f"benchmark message {i}"})
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 204, response.status_code
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    p50 = timings[len(timings) // 2] * 1000
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000
+    mean = statistics.mean(timings) * 1000
+    print(f"{label:<22} mean {mean:7.3f} ms   p50 {p50:7.3f} ms   p99 {p99:7.3f} ms")
+    return mean
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500, help="Messages to send per mode")
+    parser.add_argument("--latency", type=float, default=0.0, help="Artificial server latency in seconds")
+    args = parser.parse_args()
+
+    with StubWebhookServer(latency=args.latency) as server:
+        url = server.webhook_url()
+
+        fresh = time_posts(requests.post, url, args.messages)
+
+        close_http_session()
+        pooled = time_posts(get_http_session().post, url, args.messages)
+        close_http_session()
+
+    fresh_mean = report("requests.post", fresh)
+    pooled_mean = report("pooled session", pooled)
+    print(f"Saved per message: {fresh_mean - pooled_mean:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
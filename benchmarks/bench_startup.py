@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Measure how long the `diss` entry point takes to start.
+
+Reports the cumulative import time of disscli.main (from `python -X importtime`)
+and the wall-clock time of whole `diss` invocations against a local stub
+webhook server. Results can be saved with --output and compared against an
+earlier run with --baseline, which exits non-zero when a metric regressed by
+more than --tolerance.
+
+Usage: python benchmarks/bench_startup.py [--runs N] [--output FILE] [--baseline FILE]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from stub_server import StubWebhookServer  # noqa: E402
+
+
+def import_times(runs, env):
+    # Cumulative microseconds for disscli.main and each module it imports
+    # directly, keeping the best run to filter out noise from the machine
+    best = None
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import disscli.main"],
+            cwd=REPO_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        children = {}
+        modules = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative_us, name = line.split("|")
+            name = name[1:].rstrip()
+            depth = (len(name) - len(name.lstrip())) // 2
+            if depth == 1:
+                children[name.strip()] = int(cumulative_us)
+            elif depth == 0:
+                if name == "disscli.main":
+                    modules = dict(children, **{name: int(cumulative_us)})
+                children = {}
+        if best is None or modules["disscli.main"] < best["disscli.main"]:
+            best = modules
+    return best
+
+
+def wall_clock(argv, runs, env):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        # stdin must not be inherited, or diss would wait to read piped input
+        subprocess.run(argv, cwd=REPO_DIR, env=env, stdin=subprocess.DEVNULL, capture_output=True, check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def run_benchmarks(runs):
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ)
+    env.update({
+        "DISSCLI_CONFIG_PATH": os.path.join(workdir, "config.json"),
+        "DISSCLI_DB_PATH": os.path.join(workdir, "history.db"),
+        "DISSCLI_SOCKET_PATH": os.path.join(workdir, "diss.sock"),
+        "PYTHONPATH": REPO_DIR,
+    })
+    diss = [sys.executable, "-m", "disscli.main"]
+
+    with StubWebhookServer() as server:
+        subprocess.run(diss + ["addhook", server.webhook_url(), "bench"], cwd=REPO_DIR, env=env,
+                       stdin=subprocess.DEVNULL, capture_output=True, check=True)
+        imports = import_times(runs, env)
+        results = {
+            "import_disscli_main_ms": imports["disscli.main"] / 1000,
+            "python_baseline_ms": wall_clock([sys.executable, "-c", "pass"], runs, env),
+            "diss_help_ms": wall_clock(diss, runs, env),
+            "diss_send_ms": wall_clock(diss + ["startup benchmark"], runs, env),
+        }
+
+    heaviest = sorted(
+        ((name, us) for name, us in imports.items() if name != "disscli.main"),
+        key=lambda item: item[1], reverse=True,
+    )[:5]
+    return results, heaviest
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for metric, value in results.items():
+        previous = baseline.get(metric)
+        if previous and metric != "python_baseline_ms" and value > previous * (1 + tolerance):
+            regressions.append(f"{metric}: {previous:.1f} ms -> {value:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="Runs per measurement")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results previously written with --output")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slowdown against the baseline as a fraction (defaults to 0.2)")
+    args = parser.parse_args()
+
+    results, heaviest = run_benchmarks(args.runs)
+    for metric, value in results.items():
+        print(f"{metric:<26} {value:8.1f}")
+    print("Heaviest imports under disscli.main:")
+    for name, us in heaviest:
+        print(f"  {name:<24} {us / 1000:8.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Startup regressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""A local stand-in for the Discord webhook endpoint used by the benchmarks."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubWebhookHandler(BaseHTTPRequestHandler):
+    # Keep-alive needs HTTP/1.1; the default HTTP/1.0 closes after every response
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+        if server.record_payloads:
+            server.payloads.append(json.loads(body or b"{}"))
+        if server.latency:
+            time.sleep(server.latency)
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubWebhookServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, record_payloads=False):
+        super().__init__(("127.0.0.1", 0), StubWebhookHandler)
+        self.latency = latency
+        self.record_payloads = record_payloads
+        self.payloads = []
+        self.request_count = 0
+        self.lock = threading.Lock()
+        self._thread = None
+
+    def webhook_url(self, hook_id=1):
+        host, port = self.server_address
+        return f"http://{host}:{port}/api/webhooks/{hook_id}/token"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
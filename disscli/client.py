@@ -0,0 +1,198 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from disscli import main as cli
+
+# Posts run on a private thread pool through the CLI's pooled HTTP session
+# and rate limiter, so awaiting them never blocks the event loop and the
+# only dependency stays requests.
+
+DEFAULT_CONCURRENCY = cli.DEFAULT_BROADCAST_CONCURRENCY
+
+
+class SendResult:
+    # The outcome of one message to one webhook. status_code is Discord's
+    # answer to the last chunk posted, or None if nothing was posted;
+    # error explains any failure.
+    __slots__ = ("hook", "webhook_url", "content", "status_code", "error", "chunks_sent")
+
+    def __init__(self, hook, webhook_url, content, status_code=None, error=None, chunks_sent=0):
+        self.hook = hook
+        self.webhook_url = webhook_url
+        self.content = content
+        self.status_code = status_code
+        self.error = error
+        self.chunks_sent = chunks_sent
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        outcome = "ok" if self.ok else f"error={self.error!r}"
+        return f"SendResult(hook={self.hook!r}, status_code={self.status_code}, {outcome})"
+
+
+class AsyncWebhookClient:
+    # Send to the hooks registered with 'diss addhook' from asyncio code:
+    #
+    #     async with AsyncWebhookClient(concurrency=16) as client:
+    #         result = await client.send("Deploy finished", hook="ops")
+    #         results = await client.broadcast("Maintenance at 22:00", group="oncall")
+    #
+    # The hook registry and config are read once and cached; call refresh()
+    # to pick up changes. Delivered messages are written to the history
+    # database in one transaction per call unless record_history is False.
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, username=None, avatar_url=None, record_history=True):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.concurrency = concurrency
+        self.username = username
+        self.avatar_url = avatar_url
+        self.record_history = record_history
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="disscli-client")
+        self._registry = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        # Wait for posts still in flight without holding up the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(func, *args))
+
+    def _load_registry(self):
+        cli.init_db(quiet=True)
+        with cli.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name, webhook_url, is_default FROM hooks")
+            rows = cursor.fetchall()
+        config = cli.load_config()
+        return {
+            "hooks": {name: webhook_url for name, webhook_url, _ in rows},
+            "default": next((name for name, _, is_default in rows if is_default), None),
+            "username": config.get("username", "DissBot"),
+            "avatar_url": config.get("avatar_url"),
+        }
+
+    async def refresh(self):
+        self._registry = await self._run(self._load_registry)
+        return self._registry
+
+    async def hooks(self):
+        # {name: webhook_url} of every registered hook
+        registry = self._registry or await self.refresh()
+        return dict(registry["hooks"])
+
+    def _target(self, registry, hook, content, username, avatar_url):
+        # (hook, webhook_url, username, avatar_url) for one message, or a
+        # failed SendResult when it can't be sent
+        hook = hook or registry["default"]
+        if hook is None:
+            return SendResult(None, None, content, error="No hook given and no default hook is set")
+        webhook_url = registry["hooks"].get(hook)
+        if webhook_url is None:
+            return SendResult(hook, None, content, error=f"Unknown hook '{hook}'")
+        if not isinstance(content, str) or not content.strip():
+            return SendResult(hook, webhook_url, content, error="Cannot send empty message")
+        return (
+            hook,
+            webhook_url,
+            username or self.username or registry["username"],
+            avatar_url or self.avatar_url or registry["avatar_url"],
+        )
+
+    def _deliver(self, hook, webhook_url, username, avatar_url, content):
+        # Runs on the pool: post every chunk of the message in order,
+        # stopping at the first one that fails. Returns the result and the
+        # chunks that were delivered.
+        import requests
+        result = SendResult(hook, webhook_url, content)
+        sent = []
+        for chunk in cli.split_message(cli.resolve_mentions(content)):
+            try:
+                response = cli.post_message(webhook_url, username, avatar_url, chunk)
+            except requests.exceptions.RequestException as e:
+                result.error = str(e)
+                break
+            result.status_code = response.status_code
+            if response.status_code != 204:
+                result.error = f"{response.status_code} {response.text}"
+                break
+            sent.append(chunk)
+        result.chunks_sent = len(sent)
+        return result, sent
+
+    def _record(self, delivered):
+        # (hook, chunk) pairs, all in one transaction
+        with cli.get_db_connection() as conn:
+            cursor = conn.cursor()
+            for hook, chunk in delivered:
+                cli.insert_message(cursor, chunk, cli.extract_mentions(chunk), hook)
+
+    async def _send_in_order(self, targets):
+        # Send (hook, webhook_url, username, avatar_url, content) targets for
+        # one webhook, one after another
+        outcomes = []
+        for target in targets:
+            outcomes.append(await self._run(self._deliver, *target))
+        return outcomes
+
+    async def send_many(self, messages):
+        # Send {"content", "hook", "username", "avatar_url"} dicts (only
+        # content is required) and return one SendResult per message, in the
+        # same order. Each webhook gets its messages in order; different
+        # webhooks are posted to in parallel.
+        registry = self._registry or await self.refresh()
+        results = [None] * len(messages)
+        by_webhook = {}
+        for index, message in enumerate(messages):
+            content = message.get("content")
+            target = self._target(registry, message.get("hook"), content,
+                                  message.get("username"), message.get("avatar_url"))
+            if isinstance(target, SendResult):
+                results[index] = target
+                continue
+            by_webhook.setdefault(target[1], []).append((index, target + (content,)))
+
+        batches = await asyncio.gather(*(
+            self._send_in_order([target for _, target in entries]) for entries in by_webhook.values()
+        ))
+        delivered = []
+        for entries, batch in zip(by_webhook.values(), batches):
+            for (index, target), (result, sent) in zip(entries, batch):
+                results[index] = result
+                delivered.extend((target[0], chunk) for chunk in sent)
+
+        if self.record_history and delivered:
+            await self._run(self._record, delivered)
+        return results
+
+    async def send(self, content, hook=None, username=None, avatar_url=None):
+        # Send one message to a hook, or to the default hook
+        results = await self.send_many([{"content": content, "hook": hook, "username": username, "avatar_url": avatar_url}])
+        return results[0]
+
+    async def broadcast(self, content, group=None, username=None, avatar_url=None):
+        # Send a message to every hook, or to every hook in a group
+        registry = self._registry or await self.refresh()
+        if group is None:
+            hooks = list(registry["hooks"])
+        else:
+            members = set(await self._run(self._group_members, group))
+            hooks = [name for name in registry["hooks"] if name in members]
+        return await self.send_many([
+            {"content": content, "hook": hook, "username": username, "avatar_url": avatar_url} for hook in hooks
+        ])
+
+    def _group_members(self, group):
+        with cli.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT hook_name FROM hook_groups WHERE group_name = ?", (group,))
+            return [name for (name,) in cursor.fetchall()]
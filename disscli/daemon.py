@@ -0,0 +1,212 @@
+import json
+import os
+import queue
+import signal
+import socket
+import socketserver
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from disscli import main as cli
+
+# How often the sender thread looks for outbox entries whose retry is due,
+# in seconds. New messages wake it up straight away.
+FLUSH_INTERVAL = 1.0
+# Longest a client waits for the sender thread to queue its message
+REQUEST_TIMEOUT = 30.0
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    # One JSON request per line, answered with one JSON reply per line
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = self.server.dispatch(json.loads(line))
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+            self.wfile.write(json.dumps(reply).encode() + b"\n")
+            self.wfile.flush()
+
+
+class DissDaemon(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, flush_interval=FLUSH_INTERVAL):
+        super().__init__(socket_path, DaemonRequestHandler)
+        os.chmod(socket_path, 0o600)
+        self.socket_path = socket_path
+        self.flush_interval = flush_interval
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        # Client connections each get a thread of their own, so they hand
+        # send requests to the sender thread, which does all of the daemon's
+        # database work on one long-lived connection
+        self._requests = queue.Queue()
+        # Outbox ids queued by this daemon and claimed for its sender thread
+        self._claimed = []
+        # (rows, future) while a batch is being posted. The posting happens
+        # on another thread so new requests are queued meanwhile.
+        self._delivery = None
+        self._poster = ThreadPoolExecutor(max_workers=1)
+        self._sender = threading.Thread(target=self._run_sender, name="disscli-daemon-sender", daemon=True)
+
+    def dispatch(self, request):
+        command = request.get("command")
+        if command == "ping":
+            return {"ok": True}
+        if command == "send":
+            return self._queue_send(request.get("message"))
+        return {"ok": False, "error": f"Unknown command '{command}'"}
+
+    def _queue_send(self, message):
+        if not message or not str(message).strip():
+            return {"ok": False, "error": "Cannot send empty message"}
+        reply = Future()
+        self._requests.put((message, reply))
+        self._wake.set()
+        return reply.result(REQUEST_TIMEOUT)
+
+    def _queue_message(self, message):
+        # Runs on the sender thread
+        webhook_url = cli.get_default_hook_url()
+        if not webhook_url:
+            return {"ok": False, "error": "No webhook configured. Use 'addhook' to add one and 'hook' to set it as default."}
+
+        config = cli.load_config()
+        username = config.get("username", "DissBot")
+        avatar_url = config.get("avatar_url")
+
+        # The outbox makes the hand-off durable, so the client can be answered
+        # before the message goes out over the network
+        ids = cli.enqueue_message(webhook_url, username, avatar_url, message, claim=True)
+        if ids is None:
+            return {"ok": True, "queued": [], "repeat": True}
+        self._claimed.extend(ids)
+        return {"ok": True, "queued": ids}
+
+    def _handle_requests(self):
+        while True:
+            try:
+                message, reply = self._requests.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                reply.set_result(self._queue_message(message))
+            except Exception as e:
+                reply.set_result({"ok": False, "error": str(e)})
+
+    def _finish_delivery(self):
+        rows, future = self._delivery
+        self._delivery = None
+        try:
+            results = future.result()
+        except Exception as e:
+            print(f"Error flushing outbox: {e}")
+            results = {}
+        # Also releases the claims of rows that were not tried
+        cli.record_outbox_results(rows, results)
+
+    def _start_delivery(self):
+        # Post the messages handed to this daemon, and any due retries that
+        # no other process is sending right now
+        cli.flush_digests(post=False)
+        rows = []
+        if self._claimed:
+            rows = cli.claim_outbox(ids=self._claimed, ignore_backoff=True)
+            self._claimed = []
+        rows += cli.claim_outbox()
+        if rows:
+            future = self._poster.submit(cli.deliver_outbox, rows)
+            future.add_done_callback(lambda _: self._wake.set())
+            self._delivery = (rows, future)
+
+    def _run_sender(self):
+        try:
+            while not self._stopping.is_set():
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                try:
+                    self._handle_requests()
+                    if self._delivery is not None and self._delivery[1].done():
+                        self._finish_delivery()
+                    if self._delivery is None:
+                        self._start_delivery()
+                        cli.enforce_retention()
+                except Exception as e:
+                    print(f"Error flushing outbox: {e}")
+
+            # Give anything still queued one last try before exiting
+            self._handle_requests()
+            if self._delivery is not None:
+                self._finish_delivery()
+            if self._claimed:
+                cli.flush_outbox(ids=self._claimed, ignore_backoff=True)
+                self._claimed = []
+            cli.flush_outbox()
+        except Exception as e:
+            print(f"Error flushing outbox: {e}")
+        finally:
+            self._poster.shutdown()
+            cli.close_db_connection()
+
+    def serve(self):
+        self._sender.start()
+        self.serve_forever()
+
+    def stop_sender(self):
+        self._stopping.set()
+        self._wake.set()
+        if self._sender.is_alive():
+            self._sender.join()
+
+    def stop(self):
+        # For use from another thread while serve() is running
+        self.shutdown()
+        self.stop_sender()
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def _daemon_running(socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+def _raise_exit(signum, frame):
+    raise SystemExit(0)
+
+
+def run_daemon(socket_path=None):
+    socket_path = socket_path or cli.SOCKET_PATH
+    if not hasattr(socket, "AF_UNIX"):
+        print("Error: The daemon needs Unix domain sockets, which this platform does not support.")
+        return
+
+    if os.path.exists(socket_path):
+        if _daemon_running(socket_path):
+            print(f"Error: A daemon is already listening on '{socket_path}'.")
+            return
+        # Left behind by a daemon that did not shut down cleanly
+        os.unlink(socket_path)
+
+    cli.init_db()
+    # From here on the sender thread holds the daemon's only connection
+    cli.close_db_connection()
+    server = DissDaemon(socket_path)
+    signal.signal(signal.SIGTERM, _raise_exit)
+    print(f"diss daemon listening on '{socket_path}'.")
+    try:
+        server.serve()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.stop_sender()
+        server.server_close()
+        print("diss daemon stopped.")
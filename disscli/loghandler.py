@@ -0,0 +1,160 @@
+import logging
+import queue
+import threading
+
+from disscli import main as cli
+
+# How often queued records are sent, in seconds
+DEFAULT_FLUSH_INTERVAL = 5.0
+# Records held in memory before new ones are dropped or spilled to disk
+DEFAULT_MAX_QUEUE = 10000
+# Longest flush() and close() wait for queued records to go out, so an
+# unreachable webhook can't hang the program at exit
+FLUSH_TIMEOUT = 10.0
+
+
+class WebhookHandler(logging.Handler):
+    # Send log records to a Discord webhook without slowing down the code
+    # that logs them:
+    #
+    #     handler = WebhookHandler(hook="alerts", level=logging.WARNING)
+    #     logging.getLogger().addHandler(handler)
+    #
+    # emit() only formats the record and puts it on a bounded queue. A
+    # background thread collects everything queued during each flush
+    # interval into as few 2000-character messages as it takes and posts
+    # them through the shared session and rate limiter. When the queue is
+    # full (Discord is slow, unreachable or rate limiting us), new records
+    # are appended to spill_path if one is given and dropped otherwise; the
+    # next message says how many were missed.
+    def __init__(self, hook=None, webhook_url=None, level=logging.NOTSET, username=None, avatar_url=None,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, max_queue=DEFAULT_MAX_QUEUE, spill_path=None):
+        super().__init__(level)
+        self.hook = hook
+        self.webhook_url = webhook_url
+        self.username = username
+        self.avatar_url = avatar_url
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self.dropped = 0
+        self.spilled = 0
+        self.send_errors = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._missed = 0
+        self._missed_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._idle = threading.Condition()
+        self._pending = 0
+        self._worker = threading.Thread(target=self._run, name="disscli-log-handler", daemon=True)
+        self._worker.start()
+
+    def emit(self, record):
+        if threading.current_thread() is self._worker:
+            # urllib3 logging about our own posts would feed back into the queue
+            return
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self._idle:
+            self._pending += 1
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self._overflow(line)
+            self._done(1)
+
+    def _overflow(self, line):
+        spilled = False
+        if self.spill_path:
+            try:
+                with self._spill_lock, open(self.spill_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+                spilled = True
+            except OSError:
+                pass
+        with self._missed_lock:
+            self._missed += 1
+            if spilled:
+                self.spilled += 1
+            else:
+                self.dropped += 1
+
+    def _done(self, count):
+        with self._idle:
+            self._pending -= count
+            if not self._pending:
+                self._idle.notify_all()
+
+    def _target(self):
+        if self.webhook_url is None:
+            cli.init_db(quiet=True)
+            self.webhook_url = cli.get_hook_url(self.hook) if self.hook else cli.get_default_hook_url()
+        if self.username is None:
+            config = cli.load_config()
+            self.username = config.get("username", "DissBot")
+            self.avatar_url = self.avatar_url or config.get("avatar_url")
+        return self.webhook_url
+
+    def _drain(self):
+        lines = []
+        while True:
+            try:
+                lines.append(self._queue.get_nowait())
+            except queue.Empty:
+                return lines
+
+    def _send(self, lines):
+        with self._missed_lock:
+            missed, self._missed = self._missed, 0
+        if missed:
+            where = f" (written to '{self.spill_path}')" if self.spill_path else ""
+            lines.append(f"... {missed} log records were not sent because the queue was full{where}")
+
+        webhook_url = self._target()
+        if not webhook_url:
+            self.send_errors += 1
+            return
+        # One code block for the whole interval; split_message re-opens it in
+        # every chunk when it doesn't fit in one message
+        for chunk in cli.split_message("```\n" + "\n".join(lines) + "\n```"):
+            try:
+                response = cli.post_message(webhook_url, self.username, self.avatar_url, chunk)
+                failed = response.status_code != 204
+            except Exception:
+                failed = True
+            if failed:
+                self.send_errors += 1
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._flush_queue()
+        self._flush_queue()
+
+    def _flush_queue(self):
+        lines = self._drain()
+        if not lines:
+            return
+        count = len(lines)
+        try:
+            self._send(lines)
+        finally:
+            self._done(count)
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        # Send whatever is queued now and wait for it to go out
+        self._wake.set()
+        with self._idle:
+            self._idle.wait_for(lambda: not self._pending, timeout)
+
+    def close(self):
+        self._stopping.set()
+        self._wake.set()
+        if self._worker.is_alive() and self._worker is not threading.current_thread():
+            self._worker.join(FLUSH_TIMEOUT)
+        super().close()
@@ -1,17 +1,109 @@
 import os
 import json
-import argparse
-import sqlite3
-import requests
 import sys
 import signal
+import threading
+import time
+from types import SimpleNamespace
+
+from disscli.ratelimit import RateLimitScheduler
+
+# requests, sqlite3, argparse and friends are imported inside the functions
+# that use them. `diss` runs from shell and git hooks, where interpreter
+# start-up is most of the cost, and a plain send handed to the daemon never
+# needs them. benchmarks/bench_startup.py tracks this.
 
 # Allow overriding paths for testing
 CONFIG_PATH = os.getenv('DISSCLI_CONFIG_PATH', os.path.expanduser("~/.dissconfig"))
 DB_PATH = os.getenv('DISSCLI_DB_PATH', os.path.expanduser("~/.disscli_history.db"))
-
-# Ignore SIGPIPE and handle BrokenPipeError gracefully
-signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+SOCKET_PATH = os.getenv('DISSCLI_SOCKET_PATH', os.path.expanduser("~/.disscli.sock"))
+RESOLUTION_CACHE_PATH = os.getenv('DISSCLI_CACHE_PATH', os.path.expanduser("~/.disscli_cache.json"))
+
+# Discord rejects message content longer than this many characters
+DISCORD_MESSAGE_LIMIT = 2000
+
+# `diss --follow` sends what it has gathered once this many seconds have
+# passed since the first line, or once it reaches the size cap (leaving room
+# for the code fence), whichever comes first
+FOLLOW_WINDOW = 5.0
+FOLLOW_MAX_SIZE = DISCORD_MESSAGE_LIMIT - len("```\n\n```")
+
+# Piped input is read with bounded memory: the first PIPE_HEAD_KB and the
+# last PIPE_TAIL_KB kilobytes are kept and everything in between is counted
+# and replaced with a note
+PIPE_HEAD_KB = 64
+PIPE_TAIL_KB = 64
+
+# Number of webhooks a broadcast posts to at the same time
+DEFAULT_BROADCAST_CONCURRENCY = 8
+
+# Sizing for the shared HTTP connection pool: how many hosts keep a pool and
+# how many keep-alive connections each host's pool holds
+HTTP_POOL_CONNECTIONS = int(os.getenv('DISSCLI_POOL_CONNECTIONS', '4'))
+HTTP_POOL_MAXSIZE = int(os.getenv('DISSCLI_POOL_MAXSIZE', str(DEFAULT_BROADCAST_CONCURRENCY)))
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+# SQLite tuning. The journal mode and synchronous level are left at SQLite's
+# defaults unless set, e.g. DISSCLI_JOURNAL_MODE=WAL and
+# DISSCLI_SYNCHRONOUS=NORMAL trade a little durability on power loss for far
+# fewer fsyncs.
+DB_JOURNAL_MODE = os.getenv('DISSCLI_JOURNAL_MODE')
+DB_SYNCHRONOUS = os.getenv('DISSCLI_SYNCHRONOUS')
+DB_STATEMENT_CACHE_SIZE = 128
+
+_db_local = threading.local()
+
+# (stamp, config) read by load_config
+_config_snapshot = None
+
+# The user directory as (trie of lower-cased names, names by user id), loaded
+# on first use and kept for the life of the process
+_user_directory = None
+_user_directory_lock = threading.Lock()
+
+# Retry schedule for messages waiting in the outbox: the delay doubles after
+# every failed attempt, starting at OUTBOX_BASE_DELAY and capped at
+# OUTBOX_MAX_DELAY seconds
+OUTBOX_BASE_DELAY = 5
+OUTBOX_MAX_DELAY = 3600
+# How many due outbox messages a plain send drains on its way out
+OUTBOX_CLI_BATCH = 10
+# Outbox messages are claimed by the process posting them for this many
+# seconds, so concurrent drainers never post the same one twice. A claim
+# left behind by a process that died expires after it.
+OUTBOX_CLAIM_TIMEOUT = 900
+
+OUTBOX_SENT = "sent"
+OUTBOX_RETRY = "retry"
+OUTBOX_DROPPED = "dropped"
+
+# Bumped whenever init_db creates something new, so an up-to-date database
+# can be recognised from PRAGMA user_version without inspecting sqlite_master
+SCHEMA_VERSION = 12
+
+# History export and import stream rows instead of loading them, fetching
+# and inserting this many at a time
+HISTORY_CHUNK_SIZE = 5000
+HISTORY_FIELDS = ["message", "mentions", "sent_at", "hook_name"]
+
+# 'diss send --from' queues and flushes this many records at a time
+SEND_BATCH_SIZE = 1000
+
+REPEAT_NOTICE = "Not sent: the same message went to this hook recently. It will be counted as a repeat."
+
+# History retention. Rules live under "retention" in the config file and are
+# enforced RETENTION_BATCH rows at a time after normal sends, so no single
+# run stalls; pruned rows are appended to gzipped JSONL files in
+# ARCHIVE_DIR.
+ARCHIVE_DIR = os.getenv('DISSCLI_ARCHIVE_DIR', os.path.expanduser("~/.disscli_archive"))
+RETENTION_BATCH = 500
+# Free pages handed back to the filesystem per run
+RETENTION_VACUUM_PAGES = 2000
 
 # Add these constants at the top level after the existing constants
 COMMAND_ALIASES = {
@@ -25,20 +117,198 @@ COMMAND_ALIASES = {
     "b": "broadcast"
 }
 
-def load_config():
-    # Don't expand the path - use the exact CONFIG_PATH value
-    if not os.path.exists(CONFIG_PATH):
+def _config_stamp():
+    # What the cached config was read from. The file's stat result in file
+    # mode; in database mode, SQLite's data_version, which changes only when
+    # another connection commits.
+    stamp = _file_stamp(CONFIG_PATH)
+    if stamp is not None or not os.path.exists(DB_PATH):
+        return stamp
+    return ["db", get_db_connection().execute("PRAGMA data_version").fetchone()[0]]
+
+
+def _read_settings():
+    import sqlite3
+    try:
+        rows = get_db_connection().execute("SELECT key, value FROM settings").fetchall()
+    except sqlite3.OperationalError:
+        # Database from before the settings table existed
+        return {}
+    return {key: json.loads(value) for key, value in rows}
+
+
+def _read_config(stamp):
+    if stamp is None:
         return {}
+    if stamp[0] == "db":
+        return _read_settings()
+    # Don't expand the path - use the exact CONFIG_PATH value
     with open(CONFIG_PATH, "r") as f:
         return json.load(f)
 
 
-def save_config(config):
-    with open(CONFIG_PATH, "w") as f:
+def load_config():
+    # Settings are read once per process and served from memory after that.
+    # Callers get their own copy, so changing it does nothing until it is
+    # passed to save_config.
+    global _config_snapshot
+    import copy
+    stamp = _config_stamp()
+    snapshot = _config_snapshot
+    if snapshot is None or snapshot[0] != stamp:
+        snapshot = _config_snapshot = (stamp, _read_config(stamp))
+    return copy.deepcopy(snapshot[1])
+
+
+def config_store():
+    # "db" once the config has been moved into the history database,
+    # otherwise "file"
+    stamp = _config_stamp()
+    return "db" if stamp is not None and stamp[0] == "db" and _read_settings() else "file"
+
+
+def _write_config_file(config):
+    # Write to a temporary file and rename it over the old one, so a crash
+    # or a concurrent reader never sees half a file
+    temp_path = f"{CONFIG_PATH}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
         json.dump(config, f, indent=4)
+    os.replace(temp_path, CONFIG_PATH)
 
 
-def init_db():
+def _write_settings(config):
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM settings")
+        cursor.executemany(
+            "INSERT INTO settings (key, value) VALUES (?, ?)",
+            ((key, json.dumps(value)) for key, value in config.items()),
+        )
+
+
+def save_config(config):
+    global _config_snapshot
+    import copy
+    if config_store() == "db":
+        _write_settings(config)
+    else:
+        _write_config_file(config)
+    _config_snapshot = (_config_stamp(), copy.deepcopy(config))
+
+
+def reset_config_cache():
+    global _config_snapshot
+    _config_snapshot = None
+
+
+def move_config(store):
+    # Move the settings between the config file and the history database.
+    # With everything in the database a send reads a single file.
+    global _config_snapshot
+    current = config_store()
+    if store == current:
+        print(f"Configuration is already stored in the {'database' if store == 'db' else 'config file'}.")
+        return
+    config = load_config()
+    if store == "db":
+        if not config:
+            print("Configuration is empty; nothing to move.")
+            return
+        _write_settings(config)
+        os.remove(CONFIG_PATH)
+        print(f"Moved {len(config)} configuration keys into '{DB_PATH}'.")
+    else:
+        _write_config_file(config)
+        with get_db_connection() as conn:
+            conn.execute("DELETE FROM settings")
+        print(f"Moved {len(config)} configuration keys into '{CONFIG_PATH}'.")
+    _config_snapshot = None
+    invalidate_resolution_cache()
+
+
+def create_mentions_table(cursor):
+    # One row per user mentioned in a message, so mention lookups and counts
+    # are indexed queries instead of splitting comma-joined strings
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS mentions (
+            message_id INTEGER NOT NULL,
+            user TEXT NOT NULL,
+            PRIMARY KEY (message_id, user)
+        )
+        """
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_mentions_user ON mentions (user, message_id)")
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS mentions_delete AFTER DELETE ON messages BEGIN
+            DELETE FROM mentions WHERE message_id = old.id;
+        END
+        """
+    )
+
+    # Carry over mentions recorded before the table existed
+    cursor.execute("SELECT id, mentions FROM messages WHERE mentions IS NOT NULL")
+    rows = cursor.fetchall()
+    cursor.executemany(
+        "INSERT OR IGNORE INTO mentions (message_id, user) VALUES (?, ?)",
+        ((message_id, user) for message_id, mentions in rows for user in mentions.split(",") if user),
+    )
+
+
+def create_hook_groups_table(cursor):
+    # Group membership of hooks; the primary key answers "which hooks are
+    # in this group" and the second index "which groups is this hook in"
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS hook_groups (
+            group_name TEXT NOT NULL,
+            hook_name TEXT NOT NULL,
+            PRIMARY KEY (group_name, hook_name)
+        )
+        """
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_hook_groups_hook ON hook_groups (hook_name)")
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS hook_groups_delete AFTER DELETE ON hooks BEGIN
+            DELETE FROM hook_groups WHERE hook_name = old.name;
+        END
+        """
+    )
+
+
+def create_message_index(cursor):
+    # Full-text index over the message history, kept in step with the
+    # messages table by triggers and filled from any existing rows in one pass
+    cursor.execute("CREATE VIRTUAL TABLE messages_fts USING fts5(message, content='messages', content_rowid='id')")
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts (rowid, message) VALUES (new.id, new.message);
+        END
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, message) VALUES ('delete', old.id, old.message);
+        END
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF message ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, message) VALUES ('delete', old.id, old.message);
+            INSERT INTO messages_fts (rowid, message) VALUES (new.id, new.message);
+        END
+        """
+    )
+    cursor.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+
+
+def init_db(quiet=False):
+    import sqlite3
     # Create the database file and parent directory if they don't exist
     db_dir = os.path.dirname(DB_PATH)
     db_existed = os.path.exists(DB_PATH)
@@ -47,14 +317,27 @@ def init_db():
         os.makedirs(db_dir)
         
     if not db_existed:
+        # A cached connection would still point at the file that was removed
+        close_db_connection()
         open(DB_PATH, 'a').close()
 
     with get_db_connection() as conn:
         cursor = conn.cursor()
+        if db_existed:
+            cursor.execute("PRAGMA user_version")
+            if cursor.fetchone()[0] >= SCHEMA_VERSION:
+                return
+
         # Check if tables exist first
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
         existing_tables = {table[0] for table in cursor.fetchall()}
         tables_created = False
+
+        # Let pruned history give its space back to the filesystem. This is
+        # free on a new database; an existing one is rebuilt by 'diss prune'
+        # instead, since that can take a while on a large history.
+        if not existing_tables:
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
         
         # Create tables if they don't exist
         if 'messages' not in existing_tables:
@@ -63,11 +346,23 @@ def init_db():
                 CREATE TABLE IF NOT EXISTS messages (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     message TEXT NOT NULL,
-                    mentions TEXT
+                    mentions TEXT,
+                    sent_at REAL,
+                    hook_name TEXT
                 )
                 """
             )
             tables_created = True
+        else:
+            # Histories from before messages were timestamped
+            cursor.execute("PRAGMA table_info(messages)")
+            columns = {column[1] for column in cursor.fetchall()}
+            if 'sent_at' not in columns:
+                cursor.execute("ALTER TABLE messages ADD COLUMN sent_at REAL")
+            if 'hook_name' not in columns:
+                cursor.execute("ALTER TABLE messages ADD COLUMN hook_name TEXT")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_sent_at ON messages (sent_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_hook_name ON messages (hook_name)")
             
         if 'hooks' not in existing_tables:
             cursor.execute(
@@ -75,14 +370,123 @@ def init_db():
                 CREATE TABLE IF NOT EXISTS hooks (
                     name TEXT PRIMARY KEY,
                     webhook_url TEXT NOT NULL,
-                    is_default INTEGER DEFAULT 0
+                    is_default INTEGER DEFAULT 0,
+                    dedup_window REAL
+                )
+                """
+            )
+            tables_created = True
+        else:
+            cursor.execute("PRAGMA table_info(hooks)")
+            if 'dedup_window' not in {column[1] for column in cursor.fetchall()}:
+                cursor.execute("ALTER TABLE hooks ADD COLUMN dedup_window REAL")
+
+        if 'outbox' not in existing_tables:
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    webhook_url TEXT NOT NULL,
+                    username TEXT,
+                    avatar_url TEXT,
+                    message TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    claimed_until REAL NOT NULL DEFAULT 0
+                )
+                """
+            )
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_outbox_next_attempt ON outbox (next_attempt_at)")
+            tables_created = True
+        else:
+            cursor.execute("PRAGMA table_info(outbox)")
+            if 'claimed_until' not in {column[1] for column in cursor.fetchall()}:
+                cursor.execute("ALTER TABLE outbox ADD COLUMN claimed_until REAL NOT NULL DEFAULT 0")
+
+        if 'mentions' not in existing_tables:
+            create_mentions_table(cursor)
+            tables_created = True
+
+        if 'users' not in existing_tables:
+            # Discord user ids by name, so "@name" can become a real ping
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS users (
+                    name TEXT PRIMARY KEY COLLATE NOCASE,
+                    user_id TEXT NOT NULL
+                )
+                """
+            )
+            tables_created = True
+
+        if 'dedup' not in existing_tables:
+            # When each message was last sent to each hook, by content hash,
+            # and how many repeats have been held back since
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dedup (
+                    webhook_url TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    last_sent_at REAL NOT NULL,
+                    repeats INTEGER NOT NULL DEFAULT 0,
+                    message TEXT,
+                    PRIMARY KEY (webhook_url, content_hash)
                 )
                 """
             )
             tables_created = True
+        else:
+            cursor.execute("PRAGMA table_info(dedup)")
+            if 'message' not in {column[1] for column in cursor.fetchall()}:
+                cursor.execute("ALTER TABLE dedup ADD COLUMN message TEXT")
+
+        if 'digests' not in existing_tables:
+            # Messages waiting to go out together in a hook's next digest
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS digests (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    webhook_url TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    added_at REAL NOT NULL,
+                    due_at REAL NOT NULL
+                )
+                """
+            )
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_digests_due ON digests (due_at)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_digests_webhook ON digests (webhook_url, due_at)")
+            tables_created = True
+
+        if 'hook_groups' not in existing_tables:
+            create_hook_groups_table(cursor)
+            tables_created = True
+
+        if 'settings' not in existing_tables:
+            # Config keys moved out of the config file, as JSON values
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS settings (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+                """
+            )
+            tables_created = True
+
+        if 'messages_fts' not in existing_tables:
+            try:
+                create_message_index(cursor)
+                tables_created = True
+            except sqlite3.OperationalError:
+                # SQLite was built without FTS5; search falls back to LIKE
+                pass
+
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         
         # Only print message if we actually created something
-        if not db_existed or tables_created:
+        if (not db_existed or tables_created) and not quiet:
             print("Database initialized successfully.")
 
 
@@ -90,23 +494,60 @@ def print_help_message():
     print("Error: No message provided or invalid command.")
     print("\nAvailable commands:")
     print("  diss \"<message>\" - Send a message to Discord.")
-    print("  diss broadcast \"<message>\" (b) - Send message to all webhooks.")
-    print("  diss list (ls) - List previously sent messages.")
+    print("  diss --follow [--window seconds] [--max-size chars] (-f) - Stream piped lines as they arrive.")
+    print("  diss broadcast \"<message>\" [--concurrency N] (b) - Send message to all webhooks.")
+    print("  diss --digest <window> \"<message>\" - Collect the message into a digest sent when the window, e.g. 10m, closes.")
+    print("  diss -g <group> \"<message>\" [--concurrency N] - Send message to every hook in a group.")
+    print("  diss tag <hook> <group>... / diss untag <hook> <group>... - Add a hook to groups or remove it.")
+    print("  diss groups - List hook groups.")
+    print("  diss dedup [<hook> <window|off>] - Count repeats of a message within the window instead of sending them.")
+    print("  diss send --from <file.jsonl> [--concurrency N] [--dry-run] - Send every message in a JSONL file.")
+    print("  diss list [--limit N] [--since 2h] [--hook name] [--user name] [--reverse] (ls) - List previously sent messages.")
+    print("  diss search <query> [--limit N] - Search sent messages.")
     print("  diss addhook \"<webhook>\" \"<name>\" - Add a new webhook.")
     print("  diss deletehook <name> (dh) - Delete an existing webhook.")
     print("  diss deletelogs (dl) - Delete all message logs.")
+    print("  diss retention [--max-age 30d] [--max-messages N] [--max-size MB] [--clear] - Show or set history retention.")
+    print("  diss prune - Apply the retention rules to the whole history now.")
+    print("  diss flush [--all] - Retry messages waiting in the outbox and send due digests.")
+    print("  diss daemon [--socket path] - Run a resident sender that plain sends hand off to.")
     print("  diss listhooks (lh) - List all hooks.")
     print("  diss hook <name> - Set the current hook.")
     print("  diss whathook (wh) - Show the current hook name.")
-    print("  diss users - List users that have been messaged.")
+    print("  diss users - List users that have been messaged, with mention counts.")
+    print("  diss importusers <file_path> - Load Discord user ids so @name mentions ping.")
     print("  diss setuser <username> (su) - Set a custom username.")
     print("  diss whoami (who) - Show the current username.")
     print("  diss exportconfig [file_path] - Export configuration to the specified file (defaults to ~/dissconfig.json).")
     print("  diss importconfig [file_path] - Import configuration from the specified file (defaults to ~/dissconfig.json).")
+    print("  diss configstore [db|file] - Show or change where the configuration is stored.")
+    print("  diss exporthistory <file_path> [--format jsonl|csv] - Export message history (add .gz to compress).")
+    print("  diss importhistory <file_path> [--format jsonl|csv] - Import message history exported with exporthistory.")
 
 
 def get_db_connection():
-    return sqlite3.connect(DB_PATH)
+    # Connections are opened once and reused, so repeated queries hit
+    # SQLite's prepared statement cache instead of re-parsing. Each thread
+    # gets its own because sqlite3 connections can't be shared between
+    # threads; the CLI itself only ever uses one.
+    conn = getattr(_db_local, "conn", None)
+    if conn is None or _db_local.path != DB_PATH:
+        import sqlite3
+        conn = sqlite3.connect(DB_PATH, cached_statements=DB_STATEMENT_CACHE_SIZE)
+        if DB_JOURNAL_MODE:
+            conn.execute(f"PRAGMA journal_mode = {DB_JOURNAL_MODE}")
+        if DB_SYNCHRONOUS:
+            conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+        _db_local.conn = conn
+        _db_local.path = DB_PATH
+    return conn
+
+
+def close_db_connection():
+    conn = getattr(_db_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _db_local.conn = None
 
 
 def add_hook(name, webhook_url):
@@ -124,6 +565,7 @@ def add_hook(name, webhook_url):
         # Add the hook
         cursor.execute("INSERT INTO hooks (name, webhook_url, is_default) VALUES (?, ?, ?)", 
                       (name, webhook_url, 1 if is_first_hook else 0))
+        invalidate_resolution_cache()
         print(f"Hook '{name}' added successfully.")
         if is_first_hook:
             print(f"Hook '{name}' set as default since it's the only hook.")
@@ -141,6 +583,7 @@ def delete_hook(name):
         
         is_default = result[0]
         cursor.execute("DELETE FROM hooks WHERE name = ?", (name,))
+        invalidate_resolution_cache()
         
         if is_default:
             cursor.execute("SELECT name FROM hooks LIMIT 1")
@@ -174,6 +617,7 @@ def set_default_hook(name):
 
         cursor.execute("UPDATE hooks SET is_default = 0")
         cursor.execute("UPDATE hooks SET is_default = 1 WHERE name = ?", (name,))
+        invalidate_resolution_cache()
         print(f"Hook '{name}' is now the default.")
 
 
@@ -193,25 +637,115 @@ def get_hook_url(name):
         return row[0] if row else None
 
 
-def list_users():
+def get_default_hook_url():
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT mentions FROM messages WHERE mentions IS NOT NULL")
-        rows = cursor.fetchall()
-        users = set()
-        for row in rows:
-            users.update(row[0].split(","))
-        for user in users:
-            print(user)
+        cursor.execute("SELECT webhook_url FROM hooks WHERE is_default = 1 LIMIT 1")
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _resolution_stamp():
+    # Writes in WAL mode land in the -wal file until it is checkpointed
+    return [SCHEMA_VERSION, _file_stamp(DB_PATH), _file_stamp(DB_PATH + "-wal"), _file_stamp(CONFIG_PATH)]
+
+
+def refresh_resolution_cache():
+    # Look up the default send target and cache it. The stamp is taken
+    # before the lookups, so a hook or config change made by another process
+    # while they run leaves a stamp that no longer matches instead of being
+    # hidden behind a fresh one.
+    stamp = _resolution_stamp()
+    webhook_url = get_default_hook_url()
+    if not webhook_url:
+        invalidate_resolution_cache()
+        return None
+    config = load_config()
+    target = (webhook_url, config.get("username", "DissBot"), config.get("avatar_url"))
+    temp_path = f"{RESOLUTION_CACHE_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "w") as f:
+            json.dump({"stamp": stamp, "target": list(target), "config": config}, f)
+        os.replace(temp_path, RESOLUTION_CACHE_PATH)
+    except OSError:
+        pass
+    return target
+
+
+def invalidate_resolution_cache():
+    try:
+        os.remove(RESOLUTION_CACHE_PATH)
+    except OSError:
+        pass
+
+
+def resolve_default_target():
+    # The (webhook_url, username, avatar_url) a plain send goes to. The answer
+    # is cached on disk and reused for as long as neither the database nor
+    # the config file has changed, so the hot path skips init_db and both
+    # lookups entirely. The cache also carries the rest of the config, so
+    # the process doesn't need to read it again.
+    global _config_snapshot
+    try:
+        with open(RESOLUTION_CACHE_PATH, "r") as f:
+            cached = json.load(f)
+        if cached["stamp"] == _resolution_stamp():
+            if _config_snapshot is None and isinstance(cached.get("config"), dict):
+                _config_snapshot = (_config_stamp(), cached["config"])
+            return tuple(cached["target"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    init_db()
+    return refresh_resolution_cache()
 
 
-def save_message(message, mentions):
+def get_mentioned_users():
+    # (user, mention count, last mentioned at) rows, most mentioned first
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
-            "INSERT INTO messages (message, mentions) VALUES (?, ?)",
-            (message, ",".join(mentions) if mentions else None),
+            """
+            SELECT mentions.user, COUNT(*), MAX(messages.sent_at)
+            FROM mentions JOIN messages ON messages.id = mentions.message_id
+            GROUP BY mentions.user
+            ORDER BY COUNT(*) DESC, mentions.user
+            """
         )
+        return cursor.fetchall()
+
+
+def list_users():
+    from datetime import datetime
+    for user, count, last_sent_at in get_mentioned_users():
+        last = f", last {datetime.fromtimestamp(last_sent_at):%Y-%m-%d %H:%M}" if last_sent_at else ""
+        print(f"{user} ({count} mention{'s' if count != 1 else ''}{last})")
+
+
+def insert_message(cursor, message, mentions, hook_name=None, sent_at=None):
+    cursor.execute(
+        "INSERT INTO messages (message, mentions, sent_at, hook_name) VALUES (?, ?, ?, ?)",
+        (message, ",".join(mentions) if mentions else None, sent_at or time.time(), hook_name),
+    )
+    if mentions:
+        message_id = cursor.lastrowid
+        cursor.executemany(
+            "INSERT OR IGNORE INTO mentions (message_id, user) VALUES (?, ?)",
+            ((message_id, user) for user in mentions),
+        )
+
+
+def save_message(message, mentions, hook_name=None):
+    with get_db_connection() as conn:
+        insert_message(conn.cursor(), message, mentions, hook_name)
 
 
 def list_messages():
@@ -221,6 +755,267 @@ def list_messages():
         return cursor.fetchall()
 
 
+def parse_duration(value):
+    # "90", "90s", "10m", "2h", "3d" or "1w" as a number of seconds
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+    value = str(value).strip().lower()
+    multiplier = units.get(value[-1:], None)
+    number = value[:-1] if multiplier else value
+    return float(number) * (multiplier or 1)
+
+
+def parse_since(value):
+    # A point in time given either as a duration ago ("2h") or as an ISO
+    # date/time ("2024-05-01", "2024-05-01T09:30")
+    from datetime import datetime
+    try:
+        return time.time() - parse_duration(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def iter_messages(limit=None, since=None, hook=None, reverse=False, user=None):
+    # Stream (id, message, mentions, sent_at, hook_name) rows straight from
+    # the cursor, oldest first. With a limit, the most recent `limit` rows are
+    # returned; reverse puts the newest first.
+    conditions = []
+    params = []
+    if since is not None:
+        conditions.append("sent_at >= ?")
+        params.append(since)
+    if hook is not None:
+        conditions.append("hook_name = ?")
+        params.append(hook)
+    if user is not None:
+        conditions.append("id IN (SELECT message_id FROM mentions WHERE user = ?)")
+        params.append(user if user.startswith("@") else f"@{user}")
+
+    query = "SELECT id, message, mentions, sent_at, hook_name FROM messages"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    cursor = get_db_connection().cursor()
+    if limit is None:
+        query += " ORDER BY id DESC" if reverse else " ORDER BY id"
+        yield from cursor.execute(query, params)
+        return
+
+    # Walk back from the newest row so only `limit` rows are ever read
+    query += " ORDER BY id DESC LIMIT ?"
+    rows = cursor.execute(query, params + [limit])
+    if reverse:
+        yield from rows
+    else:
+        yield from reversed(rows.fetchall())
+
+
+def print_messages(rows):
+    from datetime import datetime
+    # Write through one large buffer rather than a print per line
+    try:
+        sys.stdout.flush()
+        out = open(sys.stdout.fileno(), "w", buffering=1 << 16, closefd=False, encoding="utf-8")
+    except (AttributeError, OSError, ValueError):
+        # stdout has been replaced by something without a file descriptor
+        out = None
+    write = out.write if out else sys.stdout.write
+    try:
+        for message_id, message, mentions, sent_at, hook_name in rows:
+            prefix = ""
+            if sent_at:
+                prefix += f"[{datetime.fromtimestamp(sent_at):%Y-%m-%d %H:%M:%S}] "
+            if hook_name:
+                prefix += f"({hook_name}) "
+            write(f"{prefix}Message: {message}\n")
+            if mentions:
+                write(f"Mentions: {mentions}\n")
+    finally:
+        if out:
+            out.close()
+
+
+def _quote_search_terms(query):
+    # Treat every word as a literal term, for queries that aren't valid
+    # FTS5 syntax (e.g. containing '-' or unbalanced quotes)
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+def search_messages(query, limit=20):
+    # Best matches first, as (id, snippet, mentions) rows with the matching
+    # terms wrapped in ** **
+    import sqlite3
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'")
+        if not cursor.fetchone():
+            cursor.execute(
+                "SELECT id, message, mentions FROM messages WHERE message LIKE ? ORDER BY id DESC LIMIT ?",
+                (f"%{query}%", limit),
+            )
+            return cursor.fetchall()
+
+        search = """
+            SELECT m.id, snippet(messages_fts, 0, '**', '**', '…', 16), m.mentions
+            FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+            WHERE messages_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        """
+        try:
+            cursor.execute(search, (query, limit))
+        except sqlite3.OperationalError:
+            cursor.execute(search, (_quote_search_terms(query), limit))
+        return cursor.fetchall()
+
+
+def get_retention_rules(config=None):
+    config = load_config() if config is None else config
+    return config.get("retention") or {}
+
+
+def _archive_rows(rows):
+    import gzip
+    from datetime import date
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(ARCHIVE_DIR, f"messages-{date.today():%Y-%m-%d}.jsonl.gz")
+    # Appending adds a new gzip member, which gzip readers treat as one stream
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        for message_id, message, mentions, sent_at, hook_name in rows:
+            f.write(json.dumps({
+                "id": message_id,
+                "message": message,
+                "mentions": mentions,
+                "sent_at": sent_at,
+                "hook_name": hook_name,
+            }) + "\n")
+    return path
+
+
+def prune_history(rules=None, limit=RETENTION_BATCH):
+    # Archive and delete up to `limit` of the oldest messages that break the
+    # retention rules, then hand freed pages back to the filesystem. Returns
+    # how many messages were pruned.
+    rules = get_retention_rules() if rules is None else rules
+    max_age = rules.get("max_age")
+    max_messages = rules.get("max_messages")
+    max_size_mb = rules.get("max_size_mb")
+    if not (max_age or max_messages or max_size_mb):
+        return 0
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    oldest = 0
+    if max_messages:
+        cursor.execute("SELECT COUNT(*) FROM messages")
+        oldest = max(oldest, cursor.fetchone()[0] - max_messages)
+    if max_size_mb:
+        cursor.execute("PRAGMA page_count")
+        page_count = cursor.fetchone()[0]
+        cursor.execute("PRAGMA freelist_count")
+        used_pages = page_count - cursor.fetchone()[0]
+        cursor.execute("PRAGMA page_size")
+        if used_pages * cursor.fetchone()[0] > max_size_mb * 1024 * 1024:
+            oldest = limit
+    oldest = min(oldest, limit)
+    query = "SELECT id, message, mentions, sent_at, hook_name FROM messages WHERE id IN (SELECT id FROM messages ORDER BY id LIMIT ?)"
+    params = [oldest]
+    if max_age:
+        # Messages from before they were timestamped have no sent_at and
+        # count as older than any cutoff
+        query += " OR sent_at IS NULL OR sent_at < ?"
+        params.append(time.time() - max_age)
+    query += " ORDER BY id LIMIT ?"
+    params.append(limit)
+
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    if rows:
+        _archive_rows(rows)
+        with conn:
+            ids = [row[0] for row in rows]
+            cursor.execute(f"DELETE FROM messages WHERE id IN ({','.join('?' * len(ids))})", ids)
+    # executescript steps the pragma to completion; execute() would only
+    # free a single page
+    conn.executescript(f"PRAGMA incremental_vacuum({RETENTION_VACUUM_PAGES});")
+    return len(rows)
+
+
+def enforce_retention(config=None):
+    # Called after normal sends: one small batch, and never an error that
+    # would hide the outcome of the send itself
+    rules = get_retention_rules(config)
+    if not rules:
+        return
+    try:
+        prune_history(rules)
+    except Exception as e:
+        print(f"Warning: Could not apply the history retention rules: {e}")
+
+
+def enable_incremental_vacuum():
+    # Databases created before retention existed keep freed pages until they
+    # are rebuilt once with auto_vacuum switched on. Returns whether that
+    # rebuild was needed.
+    conn = get_db_connection()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+
+def prune_command():
+    rules = get_retention_rules()
+    if not rules:
+        print("No retention rules set. Use 'diss retention' to add some.")
+        return
+    total = 0
+    while True:
+        pruned = prune_history(rules)
+        total += pruned
+        if pruned < RETENTION_BATCH:
+            break
+    if total:
+        print(f"Pruned {total} messages into '{ARCHIVE_DIR}'.")
+    else:
+        print("Nothing to prune.")
+    # Done after pruning, while the database is as small as it gets
+    if enable_incremental_vacuum():
+        print("Rebuilt the history database so pruned space is released from now on.")
+
+
+def retention_command(max_age=None, max_messages=None, max_size_mb=None, clear=False):
+    config = load_config()
+    rules = config.get("retention") or {}
+    if clear:
+        rules = {}
+    if max_age is not None:
+        rules["max_age"] = max_age
+    if max_messages is not None:
+        rules["max_messages"] = max_messages
+    if max_size_mb is not None:
+        rules["max_size_mb"] = max_size_mb
+
+    if clear or max_age is not None or max_messages is not None or max_size_mb is not None:
+        if rules:
+            config["retention"] = rules
+        else:
+            config.pop("retention", None)
+        save_config(config)
+
+    if not rules:
+        print("History is kept forever.")
+        return
+    print("History retention:")
+    if rules.get("max_age"):
+        print(f"  Messages older than {rules['max_age'] / 86400:g} days are pruned.")
+    if rules.get("max_messages"):
+        print(f"  At most {rules['max_messages']} messages are kept.")
+    if rules.get("max_size_mb"):
+        print(f"  The history database is kept under {rules['max_size_mb']} MB.")
+    print(f"  Pruned messages are archived in '{ARCHIVE_DIR}'.")
+
+
 def delete_logs():
     with get_db_connection() as conn:
         cursor = conn.cursor()
@@ -229,12 +1024,159 @@ def delete_logs():
         print(f"Successfully deleted {deleted_count} message logs.")
 
 
-def send_message(webhook_url, username, avatar_url, message):
-    if not message or not str(message).strip():
-        print("Error: Cannot send empty message")
-        return False
-        
-    mentions = [word for word in str(message).split() if word.startswith("@")]
+def get_http_session():
+    # One keep-alive session per process so repeated sends to the same host
+    # reuse their TCP/TLS connection instead of opening a new one each time
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=HTTP_POOL_CONNECTIONS,
+                pool_maxsize=HTTP_POOL_MAXSIZE,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
+
+
+def close_http_session():
+    global _http_session
+    with _http_session_lock:
+        if _http_session is not None:
+            _http_session.close()
+            _http_session = None
+
+
+def get_rate_limiter():
+    # Every send goes through one scheduler so concurrent sends to the same
+    # webhook share its rate-limit bucket
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimitScheduler()
+        return _rate_limiter
+
+
+def get_user_directory():
+    global _user_directory
+    with _user_directory_lock:
+        if _user_directory is None:
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT name, user_id FROM users")
+                rows = cursor.fetchall()
+            trie = {}
+            for name, user_id in rows:
+                node = trie
+                for char in name.lower():
+                    node = node.setdefault(char, {})
+                node[None] = user_id
+            _user_directory = (trie, {user_id: name for name, user_id in rows})
+        return _user_directory
+
+
+def reset_user_directory():
+    global _user_directory
+    with _user_directory_lock:
+        _user_directory = None
+
+
+def _is_name_char(char):
+    return char.isalnum() or char == "_"
+
+
+def resolve_mentions(message):
+    # Rewrite "@name" to Discord's "<@id>" for every name in the user
+    # directory, so the mention actually pings. Names are matched through a
+    # trie, longest first, and must end at a word boundary; names may contain
+    # dots, so "@alice." and "@alice.b" both resolve correctly.
+    message = str(message)
+    if "@" not in message:
+        return message
+    trie = get_user_directory()[0]
+    if not trie:
+        return message
+
+    parts = []
+    position = 0
+    while True:
+        at = message.find("@", position)
+        if at == -1:
+            break
+        parts.append(message[position:at])
+        position = at + 1
+        # Leave e-mail addresses and existing <@id> mentions alone
+        if at > 0 and (_is_name_char(message[at - 1]) or message[at - 1] == "<"):
+            parts.append("@")
+            continue
+
+        node = trie
+        match = None
+        end = position
+        while end < len(message) and message[end].lower() in node:
+            node = node[message[end].lower()]
+            end += 1
+            if None in node and (end == len(message) or not _is_name_char(message[end])):
+                match = (end, node[None])
+        if match:
+            parts.append(f"<@{match[1]}>")
+            position = match[0]
+        else:
+            parts.append("@")
+    parts.append(message[position:])
+    return "".join(parts)
+
+
+def import_users(file_path):
+    # Load a directory export: JSON as {"name": "id"} or a list of
+    # {"name": ..., "id": ...} objects, or CSV with name and id columns
+    import csv
+    try:
+        with open(file_path, "r", newline="") as f:
+            if file_path.lower().endswith(".csv"):
+                rows = list(csv.reader(f))
+                if rows and rows[0] and not rows[0][-1].strip().isdigit():
+                    header = [column.strip().lower() for column in rows[0]]
+                    name_column = header.index("username") if "username" in header else header.index("name")
+                    id_column = header.index("user_id") if "user_id" in header else header.index("id")
+                    rows = [(row[name_column], row[id_column]) for row in rows[1:] if row]
+                else:
+                    rows = [(row[0], row[1]) for row in rows if row]
+            else:
+                data = json.load(f)
+                if isinstance(data, dict):
+                    rows = list(data.items())
+                else:
+                    rows = [(user.get("name") or user["username"], user.get("id") or user["user_id"]) for user in data]
+    except Exception as e:
+        print(f"Error importing users: {e}")
+        return
+
+    users = [(str(name).strip().lstrip("@"), str(user_id).strip()) for name, user_id in rows]
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany("INSERT OR REPLACE INTO users (name, user_id) VALUES (?, ?)", users)
+    reset_user_directory()
+    print(f"Imported {len(users)} users from '{file_path}'.")
+
+
+def extract_mentions(message):
+    import re
+    # Plain "@name" words, plus "<@id>" pings mapped back to their names
+    mentions = []
+    for match in re.finditer(r"<@!?(\d+)>|(?<!\S)@\S+", str(message)):
+        if match.group(1):
+            name = get_user_directory()[1].get(match.group(1))
+            mentions.append(f"@{name}" if name else match.group(0))
+        else:
+            mentions.append(match.group(0))
+    return mentions
+
+
+def post_message(webhook_url, username, avatar_url, message):
     payload = {
         "content": str(message).strip()
     }
@@ -243,14 +1185,384 @@ def send_message(webhook_url, username, avatar_url, message):
     if avatar_url:
         payload["avatar_url"] = avatar_url
 
-    response = requests.post(webhook_url, json=payload)
-    if response.status_code == 204:
-        save_message(message, mentions)
-        return True
+    session = get_http_session()
+    return get_rate_limiter().send(webhook_url, lambda: session.post(webhook_url, json=payload))
+
+
+def split_message(message, limit=DISCORD_MESSAGE_LIMIT):
+    # Break a message into chunks that each fit in one Discord message,
+    # splitting on line boundaries where possible. A code block that spans
+    # chunks is closed at the end of each one and re-opened with the same
+    # fence (language included) at the start of the next, so every chunk
+    # renders on its own.
+    message = str(message)
+    if len(message) <= limit:
+        return [message]
+
+    chunks = []
+    lines = []
+    size = 0
+    fence = None
+    closer = "\n```"
+
+    def start_chunk():
+        if fence:
+            return [fence], len(fence)
+        return [], 0
+
+    def close_chunk():
+        chunks.append("\n".join(lines) + (closer if fence else ""))
+
+    lines, size = start_chunk()
+    for line in message.split("\n"):
+        if line.strip().startswith("```"):
+            next_fence = None if fence else line.strip()
+        else:
+            next_fence = fence
+        reserve = len(closer) if next_fence else 0
+
+        if size + (1 if lines else 0) + len(line) + reserve > limit:
+            if lines != start_chunk()[0]:
+                close_chunk()
+                lines, size = start_chunk()
+            # A single line longer than a whole message is cut into pieces
+            while size + (1 if lines else 0) + len(line) + reserve > limit:
+                room = max(1, limit - size - (1 if lines else 0) - len(closer if fence else ""))
+                lines.append(line[:room])
+                line = line[room:]
+                close_chunk()
+                lines, size = start_chunk()
+
+        size += (1 if lines else 0) + len(line)
+        lines.append(line)
+        fence = next_fence
+
+    if lines != start_chunk()[0]:
+        close_chunk()
+    return chunks
+
+
+def enqueue_message(webhook_url, username, avatar_url, message, claim=False):
+    # Queue a message, split into as many chunks as it takes, and return the
+    # chunks' outbox ids in sending order, or None when it was held back as
+    # a repeat
+    return queue_messages([(webhook_url, username, avatar_url, message)], claim)[0]
+
+
+def queue_messages(items, claim=False):
+    # Queue (webhook_url, username, avatar_url, message) items in a single
+    # transaction, each split into as many chunks as it takes. Returns each
+    # item's outbox ids in sending order, or None for an item held back by
+    # its hook's dedup window. With claim=True the entries are queued
+    # already claimed, for a caller that posts them itself with
+    # flush_outbox(ids=...); other drainers leave them alone meanwhile.
+    now = time.time()
+    claimed_until = now + OUTBOX_CLAIM_TIMEOUT if claim else 0
+    queued = []
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT webhook_url, dedup_window FROM hooks WHERE dedup_window > 0")
+        windows = dict(cursor.fetchall())
+        for webhook_url, username, avatar_url, message in items:
+            window = windows.get(webhook_url)
+            if window:
+                message = check_repeat(cursor, webhook_url, message, window, now)
+                if message is None:
+                    queued.append(None)
+                    continue
+            ids = []
+            for chunk in split_message(resolve_mentions(message)):
+                cursor.execute(
+                    "INSERT INTO outbox (webhook_url, username, avatar_url, message, created_at, claimed_until) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (webhook_url, username, avatar_url, chunk, now, claimed_until),
+                )
+                ids.append(cursor.lastrowid)
+            queued.append(ids)
+    return queued
+
+
+def check_repeat(cursor, webhook_url, message, window, now):
+    # Returns None when the same text already went to this hook within the
+    # last `window` seconds, counting it as a repeat. Otherwise returns the
+    # message to send, noting every repeat held back on this hook since it
+    # was last reported: of this text, and of any other.
+    import hashlib
+    content_hash = hashlib.sha256(str(message).encode("utf-8")).hexdigest()
+    cursor.execute(
+        "SELECT last_sent_at, repeats FROM dedup WHERE webhook_url = ? AND content_hash = ?",
+        (webhook_url, content_hash),
+    )
+    row = cursor.fetchone()
+    if row and now - row[0] < window:
+        cursor.execute(
+            "UPDATE dedup SET repeats = repeats + 1 WHERE webhook_url = ? AND content_hash = ?",
+            (webhook_url, content_hash),
+        )
+        return None
+
+    # This message goes out, so it reports the repeats of other messages
+    # still waiting for one. They keep their window for further repeats.
+    cursor.execute(
+        "SELECT message, repeats FROM dedup WHERE webhook_url = ? AND content_hash != ? AND repeats > 0 "
+        "ORDER BY last_sent_at",
+        (webhook_url, content_hash),
+    )
+    earlier = cursor.fetchall()
+    cursor.execute(
+        "UPDATE dedup SET repeats = 0 WHERE webhook_url = ? AND content_hash != ? AND repeats > 0",
+        (webhook_url, content_hash),
+    )
+    # Forget messages whose window has passed and whose repeats have been
+    # reported
+    cursor.execute(
+        "DELETE FROM dedup WHERE webhook_url = ? AND last_sent_at < ? AND repeats = 0",
+        (webhook_url, now - window),
+    )
+    cursor.execute(
+        "INSERT OR REPLACE INTO dedup (webhook_url, content_hash, last_sent_at, repeats, message) VALUES (?, ?, ?, 0, ?)",
+        (webhook_url, content_hash, now, repeat_preview(message)),
+    )
+
+    notes = []
+    if row and row[1]:
+        notes.append(f"(repeated {row[1]}×)")
+    for preview, repeats in earlier:
+        notes.append(f'("{preview}" was repeated {repeats}×)')
+    if not notes:
+        return message
+    separator = "\n" if "\n" in str(message) or earlier else " "
+    return f"{message}{separator}" + "\n".join(notes)
+
+
+def repeat_preview(message, limit=80):
+    # How a held-back message is named when its repeats are reported along
+    # with a different one
+    text = " ".join(str(message).split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def set_dedup_window(name, window):
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE hooks SET dedup_window = ? WHERE name = ?", (window, name))
+        if not cursor.rowcount:
+            print(f"Error: No hook found with the name '{name}'.")
+            return
+    if window:
+        print(f"Repeats of the same message to '{name}' within {window:g}s will be counted instead of sent.")
     else:
+        print(f"Every message to '{name}' will be sent, including repeats.")
+
+
+def list_dedup_windows():
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, dedup_window FROM hooks WHERE dedup_window > 0 ORDER BY name")
+        rows = cursor.fetchall()
+    if not rows:
+        print("No hooks hold back repeated messages.")
+        return
+    for name, window in rows:
+        print(f"{name}: {window:g}s")
+
+
+def count_outbox():
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM outbox")
+        return cursor.fetchone()[0]
+
+
+def outbox_retry_delay(attempts):
+    # Exponential backoff with jitter so a batch of failed sends does not
+    # come back all at once
+    import random
+    delay = min(OUTBOX_MAX_DELAY, OUTBOX_BASE_DELAY * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _deliver_outbox_entries(entries):
+    # Entries all belong to one webhook and are sent in order. A failure that
+    # can be retried stops the run so later messages don't overtake it.
+    import requests
+    results = []
+    for entry_id, webhook_url, username, avatar_url, message, attempts in entries:
+        try:
+            response = post_message(webhook_url, username, avatar_url, message)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            print(f"Failed to send message: {e}")
+            results.append((entry_id, message, attempts, OUTBOX_RETRY, str(e)))
+            break
+        except requests.exceptions.RequestException as e:
+            # Malformed URLs and the like will never succeed
+            print(f"Failed to send message: {e}")
+            results.append((entry_id, message, attempts, OUTBOX_DROPPED, str(e)))
+            continue
+
+        if response.status_code == 204:
+            results.append((entry_id, message, attempts, OUTBOX_SENT, None))
+            continue
+
         print(f"Failed to send message: {response.status_code} {response.text}")
+        error = f"{response.status_code} {response.text}"
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            # Discord rejected the message itself; retrying won't change that
+            results.append((entry_id, message, attempts, OUTBOX_DROPPED, error))
+            continue
+        results.append((entry_id, message, attempts, OUTBOX_RETRY, error))
+        break
+    return results
+
+
+def flush_outbox(ids=None, limit=None, ignore_backoff=False, concurrency=DEFAULT_BROADCAST_CONCURRENCY):
+    # Post queued messages and record the outcomes
+    rows = claim_outbox(ids, limit, ignore_backoff)
+    if not rows:
+        return {}
+    return record_outbox_results(rows, deliver_outbox(rows, concurrency))
+
+
+def claim_outbox(ids=None, limit=None, ignore_backoff=False):
+    # The outbox rows to post. `ids` are entries the caller queued with
+    # claim=True; without them, every due entry that no other process is
+    # posting is claimed first. Webhooks with an entry in flight elsewhere
+    # are skipped entirely, so their messages stay in order.
+    now = time.time()
+    query = "SELECT id, webhook_url, username, avatar_url, message, attempts FROM outbox"
+    conditions = []
+    params = []
+    if ids is not None:
+        conditions.append(f"id IN ({','.join('?' * len(ids))})")
+        params.extend(ids)
+    else:
+        conditions.append("webhook_url NOT IN (SELECT webhook_url FROM outbox WHERE claimed_until > ?)")
+        params.append(now)
+    if not ignore_backoff:
+        conditions.append("next_attempt_at <= ?")
+        params.append(now)
+    query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY id"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    conn = get_db_connection()
+    with conn:
+        cursor = conn.cursor()
+        if ids is None:
+            # Holding the write lock from the start means no other drainer
+            # can claim the same entries between the SELECT and the UPDATE
+            cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        if rows and ids is None:
+            cursor.executemany(
+                "UPDATE outbox SET claimed_until = ? WHERE id = ?",
+                [(now + OUTBOX_CLAIM_TIMEOUT, row[0]) for row in rows],
+            )
+    return rows
+
+
+def deliver_outbox(rows, concurrency=DEFAULT_BROADCAST_CONCURRENCY):
+    # Post claimed rows without touching the database. Different webhooks
+    # are delivered in parallel, each one in order. Returns the outcomes by
+    # webhook for record_outbox_results.
+    from concurrent.futures import ThreadPoolExecutor
+    by_webhook = {}
+    for row in rows:
+        by_webhook.setdefault(row[1], []).append(row)
+    workers = max(1, min(concurrency, len(by_webhook)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(by_webhook, pool.map(_deliver_outbox_entries, by_webhook.values())))
+
+
+def record_outbox_results(rows, results):
+    # Record every outcome in one transaction; a delivered message only
+    # reaches the history once it has left the outbox
+    statuses = {}
+    now = time.time()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        urls = list(results)
+        cursor.execute(f"SELECT webhook_url, name FROM hooks WHERE webhook_url IN ({','.join('?' * len(urls))})", urls)
+        hook_names = dict(cursor.fetchall())
+        for webhook_url, batch in results.items():
+            for entry_id, message, attempts, status, error in batch:
+                statuses[entry_id] = status
+                if status == OUTBOX_RETRY:
+                    cursor.execute(
+                        "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                        (attempts + 1, now + outbox_retry_delay(attempts + 1), error, entry_id),
+                    )
+                    continue
+                if status == OUTBOX_SENT:
+                    insert_message(cursor, message, extract_mentions(message), hook_names.get(webhook_url), now)
+                cursor.execute("DELETE FROM outbox WHERE id = ?", (entry_id,))
+        # Release whatever is still queued, including entries a failure
+        # stopped before they were tried
+        cursor.executemany(
+            "UPDATE outbox SET claimed_until = 0 WHERE id = ?",
+            [(row[0],) for row in rows if statuses.get(row[0]) in (None, OUTBOX_RETRY)],
+        )
+    return statuses
+
+
+def flush_command(ignore_backoff=False):
+    pending = count_outbox()
+    if not pending:
+        print("Outbox is empty.")
+        return
+
+    statuses = flush_outbox(ignore_backoff=ignore_backoff)
+    sent = sum(1 for status in statuses.values() if status == OUTBOX_SENT)
+    dropped = sum(1 for status in statuses.values() if status == OUTBOX_DROPPED)
+    print(f"Delivered {sent}/{pending} queued messages.")
+    if dropped:
+        print(f"Discarded {dropped} messages that Discord rejected.")
+    remaining = count_outbox()
+    if remaining:
+        print(f"{remaining} messages are still waiting for a retry.")
+
+
+def print_outbox_notice():
+    pending = count_outbox()
+    if pending:
+        print(f"{pending} messages are waiting in the outbox. Run 'diss flush' to retry them.")
+
+
+def send_via_daemon(message, socket_path=None):
+    # Hand the message to a running 'diss daemon'. Returns the daemon's reply,
+    # or None when no daemon is listening so the caller can send directly.
+    import socket
+    socket_path = socket_path or SOCKET_PATH
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(5)
+            sock.connect(socket_path)
+            sock.sendall(json.dumps({"command": "send", "message": message}).encode() + b"\n")
+            with sock.makefile("rb") as reply:
+                return json.loads(reply.readline())
+    except (OSError, ValueError):
+        return None
+
+
+def send_message(webhook_url, username, avatar_url, message):
+    if not message or not str(message).strip():
+        print("Error: Cannot send empty message")
         return False
 
+    # Queue the message first so a failed send is kept for a later retry
+    # instead of being lost. Long messages go out as consecutive chunks.
+    ids = enqueue_message(webhook_url, username, avatar_url, message, claim=True)
+    if ids is None:
+        print(REPEAT_NOTICE)
+        return True
+    statuses = flush_outbox(ids=ids, ignore_backoff=True)
+    return all(statuses.get(entry_id) == OUTBOX_SENT for entry_id in ids)
+
 
 def set_user(username):
     config = load_config()
@@ -265,12 +1577,71 @@ def whoami():
     print(f"Current username: {username}")
 
 
-def handle_piped_input():
+def read_bounded(stream, head_limit, tail_limit, chunk_size=65536):
+    # Read a binary stream to the end while holding at most about
+    # head_limit + tail_limit + chunk_size bytes. Returns the kept text and
+    # how many lines and bytes were left out of the middle.
+    from collections import deque
+    head = bytearray()
+    tail = deque()
+    tail_size = 0
+    omitted_bytes = 0
+    omitted_lines = 0
+
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            break
+        if len(head) < head_limit:
+            room = head_limit - len(head)
+            head += data[:room]
+            data = data[room:]
+            if not data:
+                continue
+        tail.append(data)
+        tail_size += len(data)
+        # Drop whole chunks once they have scrolled out of the tail window
+        while tail_size - len(tail[0]) >= tail_limit:
+            dropped = tail.popleft()
+            tail_size -= len(dropped)
+            omitted_bytes += len(dropped)
+            omitted_lines += dropped.count(b"\n")
+
+    tail = b"".join(tail)
+    if len(tail) > tail_limit:
+        cut = len(tail) - tail_limit
+        omitted_bytes += cut
+        omitted_lines += tail.count(b"\n", 0, cut)
+        tail = tail[cut:]
+    head = bytes(head)
+
+    if omitted_bytes:
+        # Only show whole lines on either side of the gap
+        newline = head.rfind(b"\n")
+        if newline != -1:
+            omitted_bytes += len(head) - newline - 1
+            head = head[:newline + 1]
+        newline = tail.find(b"\n")
+        if newline != -1:
+            omitted_bytes += newline + 1
+            omitted_lines += 1
+            tail = tail[newline + 1:]
+
+    text = head.decode("utf-8", errors="replace")
+    if omitted_bytes:
+        text = text.rstrip("\n") + f"\n… {omitted_lines:,} lines omitted ({omitted_bytes:,} bytes) …\n"
+    return text + tail.decode("utf-8", errors="replace"), omitted_lines, omitted_bytes
+
+
+def handle_piped_input(head_kb=PIPE_HEAD_KB, tail_kb=PIPE_TAIL_KB):
     try:
         # Check if there's input on stdin
         if not sys.stdin.isatty():
-            # Read piped input
-            piped_message = sys.stdin.read().strip()
+            # Read piped input without ever holding all of it, so piping a
+            # huge log by mistake can't exhaust memory
+            stream = getattr(sys.stdin, "buffer", sys.stdin)
+            piped_message, _, _ = read_bounded(stream, head_kb * 1024, tail_kb * 1024)
+            piped_message = piped_message.strip()
             if piped_message:
                 # Return formatted as code block
                 return f"```\n{piped_message}\n```"
@@ -280,6 +1651,58 @@ def handle_piped_input():
     return None
 
 
+def _queue_lines(stream, lines):
+    for line in stream:
+        lines.put(line.rstrip("\n"))
+    lines.put(None)
+
+
+def follow_input(stream, webhook_url, username, avatar_url, window=FOLLOW_WINDOW, max_size=FOLLOW_MAX_SIZE):
+    # Read lines from the stream as they arrive and send them as code blocks,
+    # one per window or size cap, until the stream ends. A background thread
+    # does the reading so a window can close while no new lines come in.
+    import queue
+    lines = queue.Queue()
+    threading.Thread(target=_queue_lines, args=(stream, lines), daemon=True).start()
+
+    batch = []
+    size = 0
+    deadline = None
+    sent = 0
+
+    def send_batch():
+        nonlocal batch, size, deadline, sent
+        if "".join(batch).strip():
+            if send_message(webhook_url, username, avatar_url, "```\n" + "\n".join(batch) + "\n```"):
+                sent += 1
+        batch, size, deadline = [], 0, None
+
+    try:
+        while True:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                line = lines.get(timeout=timeout)
+            except queue.Empty:
+                send_batch()
+                continue
+            if line is None:
+                break
+
+            if batch and size + 1 + len(line) > max_size:
+                send_batch()
+            size += (1 if batch else 0) + len(line)
+            batch.append(line)
+            if deadline is None:
+                deadline = time.monotonic() + window
+            if size >= max_size:
+                send_batch()
+    except KeyboardInterrupt:
+        pass
+
+    send_batch()
+    return sent
+
+
 def export_config(file_path):
     config = load_config()
     try:
@@ -300,45 +1723,503 @@ def import_config(file_path):
         print(f"Error importing configuration: {e}")
 
 
-def broadcast_message(message, username=None):
+def history_format(file_path, fmt=None):
+    # "jsonl" or "csv", from --format or the file extension; a trailing .gz
+    # means the file is gzip-compressed either way
+    compressed = file_path.endswith(".gz")
+    if fmt is None:
+        base = file_path[:-3] if compressed else file_path
+        fmt = "csv" if base.lower().endswith(".csv") else "jsonl"
+    return fmt, compressed
+
+
+def open_history_file(file_path, mode, compressed):
+    if compressed:
+        import gzip
+        return gzip.open(file_path, mode + "t", encoding="utf-8", newline="")
+    return open(file_path, mode, encoding="utf-8", newline="")
+
+
+def iter_history():
+    # Rows oldest first, read from the cursor in chunks so memory use stays
+    # flat however large the history is
+    cursor = get_db_connection().cursor()
+    cursor.execute("SELECT message, mentions, sent_at, hook_name FROM messages ORDER BY id")
+    while True:
+        rows = cursor.fetchmany(HISTORY_CHUNK_SIZE)
+        if not rows:
+            return
+        yield from rows
+
+
+def write_history(rows, f, fmt):
+    count = 0
+    if fmt == "csv":
+        import csv
+        writer = csv.writer(f)
+        writer.writerow(HISTORY_FIELDS)
+        for row in rows:
+            writer.writerow(["" if value is None else value for value in row])
+            count += 1
+        return count
+
+    for message, mentions, sent_at, hook_name in rows:
+        f.write(json.dumps({
+            "message": message,
+            "mentions": mentions.split(",") if mentions else [],
+            "sent_at": sent_at,
+            "hook_name": hook_name,
+        }) + "\n")
+        count += 1
+    return count
+
+
+def read_history(f, fmt):
+    # Yield (message, mentions, sent_at, hook_name) from an exported file,
+    # with mentions as a list
+    if fmt == "csv":
+        import csv
+        records = csv.DictReader(f)
+    else:
+        records = (json.loads(line) for line in f if line.strip())
+
+    for number, record in enumerate(records, 1):
+        message = record.get("message")
+        if not message:
+            raise ValueError(f"record {number} has no message")
+        mentions = record.get("mentions") or []
+        if isinstance(mentions, str):
+            mentions = mentions.split(",")
+        sent_at = record.get("sent_at")
+        yield (
+            message,
+            [user for user in mentions if user],
+            float(sent_at) if sent_at not in (None, "") else None,
+            record.get("hook_name") or None,
+        )
+
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def insert_history(records, chunk_size=HISTORY_CHUNK_SIZE):
+    # One transaction and two executemany calls per chunk. Returns the number
+    # of messages inserted.
+    conn = get_db_connection()
+    count = 0
+    for chunk in _chunked(records, chunk_size):
+        with conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "INSERT INTO messages (message, mentions, sent_at, hook_name) VALUES (?, ?, ?, ?)",
+                ((message, ",".join(mentions) if mentions else None, sent_at, hook_name)
+                 for message, mentions, sent_at, hook_name in chunk),
+            )
+            # The insert holds the write lock and new rows take the next ids
+            # in order, so the chunk occupies the last len(chunk) ids
+            cursor.execute("SELECT MAX(id) FROM messages")
+            first_id = cursor.fetchone()[0] - len(chunk) + 1
+            cursor.executemany(
+                "INSERT OR IGNORE INTO mentions (message_id, user) VALUES (?, ?)",
+                ((first_id + offset, user)
+                 for offset, (_, mentions, _, _) in enumerate(chunk) for user in mentions),
+            )
+        count += len(chunk)
+    return count
+
+
+def export_history(file_path, fmt=None):
+    fmt, compressed = history_format(file_path, fmt)
+    try:
+        with open_history_file(file_path, "w", compressed) as f:
+            count = write_history(iter_history(), f, fmt)
+        print(f"Exported {count} messages to '{file_path}'.")
+    except Exception as e:
+        print(f"Error exporting history: {e}")
+
+
+def import_history(file_path, fmt=None):
+    fmt, compressed = history_format(file_path, fmt)
+    try:
+        with open_history_file(file_path, "r", compressed) as f:
+            count = insert_history(read_history(f, fmt))
+        print(f"Imported {count} messages from '{file_path}'.")
+    except Exception as e:
+        print(f"Error importing history: {e}")
+
+
+def tag_hook(name, groups):
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM hooks WHERE name = ?", (name,))
+        if not cursor.fetchone():
+            print(f"Error: No hook found with the name '{name}'.")
+            return
+        cursor.executemany(
+            "INSERT OR IGNORE INTO hook_groups (group_name, hook_name) VALUES (?, ?)",
+            ((group, name) for group in groups),
+        )
+    print(f"Hook '{name}' added to {', '.join(repr(group) for group in groups)}.")
+
+
+def untag_hook(name, groups):
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "DELETE FROM hook_groups WHERE group_name = ? AND hook_name = ?",
+            ((group, name) for group in groups),
+        )
+        removed = cursor.rowcount
+    if removed:
+        print(f"Hook '{name}' removed from {removed} groups.")
+    else:
+        print(f"Hook '{name}' is not in any of those groups.")
+
+
+def list_groups():
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT group_name, hook_name FROM hook_groups ORDER BY group_name, hook_name")
+        rows = cursor.fetchall()
+    if not rows:
+        print("No hook groups. Use 'diss tag <hook> <group>' to create one.")
+        return
+    groups = {}
+    for group, hook in rows:
+        groups.setdefault(group, []).append(hook)
+    for group, hooks in groups.items():
+        print(f"{group}: {', '.join(hooks)}")
+
+
+def get_group_webhooks(group):
+    # Webhook URLs of every hook in the group, through the hook_groups
+    # primary key
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT hooks.webhook_url FROM hook_groups
+            JOIN hooks ON hooks.name = hook_groups.hook_name
+            WHERE hook_groups.group_name = ?
+            """,
+            (group,),
+        )
+        return cursor.fetchall()
+
+
+def send_to_group(group, message, username=None, concurrency=DEFAULT_BROADCAST_CONCURRENCY):
+    webhooks = get_group_webhooks(group)
+    if not webhooks:
+        print(f"Error: No hooks in group '{group}'. Use 'diss tag <hook> {group}' to add some.")
+        return
+
+    if not message or not str(message).strip():
+        print("Error: Cannot send empty message")
+        return
+
+    success_count, suppressed_count = fan_out_message(webhooks, message, username, concurrency)
+    if success_count > 0:
+        print(f"Message sent to {success_count}/{len(webhooks)} webhooks in group '{group}'.")
+    elif not suppressed_count:
+        print(f"Failed to send message to any webhooks in group '{group}'.")
+    print_repeat_notice(suppressed_count)
+    print_outbox_notice()
+
+
+def broadcast_message(message, username=None, concurrency=DEFAULT_BROADCAST_CONCURRENCY):
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT webhook_url FROM hooks")
         webhooks = cursor.fetchall()
-        
-        if not webhooks:
-            print("No webhooks registered. Add webhooks first.")
-            return
-        
-        success_count = 0
-        for (webhook_url,) in webhooks:
+
+    if not webhooks:
+        print("No webhooks registered. Add webhooks first.")
+        return
+
+    if not message or not str(message).strip():
+        print("Error: Cannot send empty message")
+        return
+
+    success_count, suppressed_count = fan_out_message(webhooks, message, username, concurrency)
+    if success_count > 0:
+        print(f"Message broadcast to {success_count}/{len(webhooks)} webhooks successfully!")
+    elif not suppressed_count:
+        print("Failed to broadcast message to any webhooks.")
+    print_repeat_notice(suppressed_count)
+    print_outbox_notice()
+
+    stats = get_rate_limiter().stats()
+    if stats["waits"]:
+        print(f"Waited {stats['wait_time']:.1f}s across {stats['waits']} sends to stay under Discord's rate limits.")
+
+
+def add_to_digest(webhook_urls, message, window):
+    # Append the message to each hook's digest. A hook's first message opens
+    # its digest for `window` seconds; later ones join it whatever window
+    # they ask for. Returns when the digests are due.
+    now = time.time()
+    due = []
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        for webhook_url in webhook_urls:
+            cursor.execute("SELECT MIN(due_at) FROM digests WHERE webhook_url = ?", (webhook_url,))
+            due_at = cursor.fetchone()[0] or now + window
+            cursor.execute(
+                "INSERT INTO digests (webhook_url, message, added_at, due_at) VALUES (?, ?, ?, ?)",
+                (webhook_url, message, now, due_at),
+            )
+            due.append(due_at)
+    return due
+
+
+def format_digest(rows):
+    # One post for a digest's (message, added_at) rows: a header with the
+    # count and time span, then each distinct message once, in order of
+    # first appearance, with how often it came in
+    from datetime import datetime
+    counts = {}
+    for message, _ in rows:
+        counts[message] = counts.get(message, 0) + 1
+    first = datetime.fromtimestamp(rows[0][1]).strftime("%H:%M")
+    last = datetime.fromtimestamp(rows[-1][1]).strftime("%H:%M")
+    span = first if first == last else f"{first}–{last}"
+    lines = [f"**Digest:** {len(rows)} messages, {span}"]
+    for message, count in counts.items():
+        lines.append(f"• {message}" + (f" ×{count}" if count > 1 else ""))
+    return "\n".join(lines)
+
+
+def flush_digests(ignore_window=False, post=True):
+    # Turn every digest that is due (or all of them) into one outbox message
+    # per hook, split into chunks as needed, and send them. With post=False
+    # they are only queued, for the next outbox drain. Returns how many
+    # digests went out.
+    now = time.time()
+    conn = get_db_connection()
+    with conn:
+        cursor = conn.cursor()
+        if ignore_window:
+            cursor.execute("SELECT DISTINCT webhook_url FROM digests")
+        else:
+            cursor.execute("SELECT DISTINCT webhook_url FROM digests WHERE due_at <= ?", (now,))
+        urls = [url for (url,) in cursor.fetchall()]
+        if not urls:
+            return 0
+
+        config = load_config()
+        items = []
+        for webhook_url in urls:
+            cursor.execute(
+                "SELECT message, added_at FROM digests WHERE webhook_url = ? ORDER BY id", (webhook_url,)
+            )
+            items.append((webhook_url, config.get("username", "DissBot"), config.get("avatar_url"),
+                          format_digest(cursor.fetchall())))
+            cursor.execute("DELETE FROM digests WHERE webhook_url = ?", (webhook_url,))
+        # Queued in the same transaction that empties the digests, so a
+        # digest is never lost or sent twice
+        queued = queue_messages(items, claim=post)
+
+    ids = [entry_id for entry_ids in queued if entry_ids for entry_id in entry_ids]
+    if ids and post:
+        flush_outbox(ids=ids, ignore_backoff=True)
+    return len(urls)
+
+
+def print_repeat_notice(suppressed_count):
+    if suppressed_count:
+        print(f"Held back a repeat of the same message for {suppressed_count} webhooks.")
+
+
+def fan_out_message(webhooks, message, username=None, concurrency=DEFAULT_BROADCAST_CONCURRENCY):
+    # Send one message to each of the (webhook_url,) rows. Returns how many
+    # of them received all of it and how many held it back as a repeat.
+    targets = []
+    for (webhook_url,) in webhooks:
+        if webhook_url is None:
+            print(f"Warning: Found a hook with no URL")
+            continue
+        targets.append(webhook_url)
+
+    # Queue every copy in one transaction, then post to the hooks in parallel
+    # so the broadcast takes about as long as the slowest hook instead of the
+    # sum of all of them. flush_outbox records all the results in one
+    # transaction as well.
+    success_count = suppressed_count = 0
+    if targets:
+        queued = queue_messages([(webhook_url, username, None, message) for webhook_url in targets], claim=True)
+        ids = [entry_id for entry_ids in queued if entry_ids for entry_id in entry_ids]
+        statuses = flush_outbox(ids=ids, ignore_backoff=True, concurrency=concurrency) if ids else {}
+        # A hook only counts once every chunk reached it
+        for entry_ids in queued:
+            if entry_ids is None:
+                suppressed_count += 1
+            elif all(statuses.get(entry_id) == OUTBOX_SENT for entry_id in entry_ids):
+                success_count += 1
+    return success_count, suppressed_count
+
+
+def parse_send_record(line, hooks, default_url, username, avatar_url):
+    # One JSONL record of 'diss send --from' as an outbox entry
+    # (webhook_url, username, avatar_url, content). Raises ValueError with
+    # the reason when the record is unusable.
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError("not a JSON object")
+    content = record.get("content")
+    if not isinstance(content, str) or not content.strip():
+        raise ValueError("'content' must be a non-empty string")
+    for field in ("hook", "username", "avatar_url"):
+        if record.get(field) is not None and not isinstance(record[field], str):
+            raise ValueError(f"'{field}' must be a string")
+    hook = record.get("hook")
+    if hook is None:
+        if not default_url:
+            raise ValueError("no 'hook' given and no default hook is set")
+        webhook_url = default_url
+    else:
+        webhook_url = hooks.get(hook)
+        if webhook_url is None:
+            raise ValueError(f"unknown hook '{hook}'")
+    return (webhook_url, record.get("username") or username, record.get("avatar_url") or avatar_url, content)
+
+
+def send_from_file(file_path, concurrency=DEFAULT_BROADCAST_CONCURRENCY, dry_run=False):
+    # Send every record of a JSONL file, SEND_BATCH_SIZE at a time: each
+    # batch is queued in one transaction and flushed through the shared
+    # pool and rate limiter, posting to different hooks in parallel.
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, webhook_url FROM hooks")
+        hooks = dict(cursor.fetchall())
+    config = load_config()
+    defaults = (get_default_hook_url(), config.get("username", "DissBot"), config.get("avatar_url"))
+
+    invalid = []
+
+    def records(f):
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
             try:
-                if webhook_url is None:
-                    print(f"Warning: Found a hook with no URL")
-                    continue
-                if send_message(webhook_url, username, None, message):
-                    success_count += 1
-            except Exception as e:
-                print(f"Failed to send to webhook URL '{webhook_url}': {e}")
-        
-        if success_count > 0:
-            print(f"Message broadcast to {success_count}/{len(webhooks)} webhooks successfully!")
+                yield parse_send_record(line, hooks, *defaults)
+            except ValueError as e:
+                invalid.append((number, str(e)))
+
+    total = sent = dropped = suppressed = 0
+    start = time.perf_counter()
+    try:
+        if file_path == "-":
+            f = sys.stdin
         else:
-            print("Failed to broadcast message to any webhooks.")
+            f = open_history_file(file_path, "r", file_path.endswith(".gz"))
+        with f:
+            for batch in _chunked(records(f), SEND_BATCH_SIZE):
+                total += len(batch)
+                if dry_run:
+                    continue
+                queued = queue_messages(batch, claim=True)
+                ids = [entry_id for entry_ids in queued if entry_ids for entry_id in entry_ids]
+                statuses = flush_outbox(ids=ids, ignore_backoff=True, concurrency=concurrency) if ids else {}
+                dropped += sum(1 for status in statuses.values() if status == OUTBOX_DROPPED)
+                # A record only counts as sent once all of its chunks were
+                for entry_ids in queued:
+                    if entry_ids is None:
+                        suppressed += 1
+                    elif all(statuses.get(entry_id) == OUTBOX_SENT for entry_id in entry_ids):
+                        sent += 1
+    except OSError as e:
+        print(f"Error reading '{file_path}': {e}")
+        return
+    elapsed = time.perf_counter() - start
+
+    if dry_run:
+        print(f"{total} records are ready to send.")
+    else:
+        rate = sent / elapsed if elapsed > 0 else 0.0
+        print(f"Sent {sent}/{total} messages in {elapsed:.1f}s ({rate:.1f} messages/sec).")
+        if dropped:
+            print(f"Discarded {dropped} messages that Discord rejected.")
+        if suppressed:
+            print(f"Held back {suppressed} repeated messages.")
+    if invalid:
+        print(f"Skipped {len(invalid)} invalid records:")
+        for number, reason in invalid[:5]:
+            print(f"  line {number}: {reason}")
+        if len(invalid) > 5:
+            print(f"  ... and {len(invalid) - 5} more")
+    if not dry_run:
+        print_outbox_notice()
+        stats = get_rate_limiter().stats()
+        if stats["waits"]:
+            print(f"Waited {stats['wait_time']:.1f}s across {stats['waits']} sends to stay under Discord's rate limits.")
+
+
+def duration_seconds(value):
+    import argparse
+    try:
+        seconds = parse_duration(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a duration like 30d or 12h")
+    if seconds <= 0:
+        raise argparse.ArgumentTypeError("must be longer than 0")
+    return seconds
+
+
+def since_time(value):
+    import argparse
+    try:
+        return parse_since(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a duration like 2h or an ISO date")
+
+
+def positive_float(value):
+    import argparse
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a number")
+    if number <= 0:
+        raise argparse.ArgumentTypeError("must be greater than 0")
+    return number
+
+
+def positive_int(value):
+    import argparse
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a whole number")
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return number
+
+
+def print_no_webhook_error():
+    print("Error: No webhook configured. Either:")
+    print("  1. Use 'addhook' to add one and 'hook' to set it as default.")
 
 
 def main():
-    # Initialize database first
-    init_db()
-    
-    # Check for piped input first
-    piped_message = handle_piped_input()
-    
+    # Exit quietly when output is piped into something that stops reading.
+    # Set here rather than at import, so importing disscli as a library
+    # (the async client, the logging handler) leaves the host's signal
+    # handling alone.
+    signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+
     # First check if we're dealing with a subcommand or a message
     import sys
 
     # Define known subcommands
-    known_subcommands = ["addhook", "listhooks", "hook", "whathook", "users", "list", "setuser", "whoami", "exportconfig", "importconfig", "deletehook", "deletelogs", "broadcast"]
+    known_subcommands = ["addhook", "listhooks", "hook", "whathook", "users", "list", "setuser", "whoami", "exportconfig", "importconfig", "deletehook", "deletelogs", "broadcast", "flush", "daemon", "search", "importusers", "retention", "prune", "exporthistory", "importhistory", "configstore", "send", "tag", "untag", "groups", "dedup"]
     
     # First, check if the first argument is an alias and replace it
     if len(sys.argv) > 1 and sys.argv[1] in COMMAND_ALIASES:
@@ -347,6 +2228,7 @@ def main():
     # Now check if we're dealing with a subcommand or a message
     if len(sys.argv) > 1 and sys.argv[1] in known_subcommands:
         # Use normal argparse for subcommands
+        import argparse
         parser = argparse.ArgumentParser(description="Send messages to Discord via webhooks.")
         subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
@@ -376,7 +2258,33 @@ def main():
         subparsers.add_parser("users", help="List users that have been messaged")
 
         # Subcommand for listing messages
-        subparsers.add_parser("list", help="List previously sent messages")
+        list_parser = subparsers.add_parser("list", help="List previously sent messages")
+        list_parser.add_argument("--limit", "-n", type=positive_int, help="Only show the most recent N messages")
+        list_parser.add_argument("--since", type=since_time,
+                                 help="Only show messages sent since a duration ago (e.g. 2h, 3d) or an ISO date")
+        list_parser.add_argument("--hook", help="Only show messages sent to this hook")
+        list_parser.add_argument("--reverse", "-r", action="store_true", help="Show the newest messages first")
+        list_parser.add_argument("--user", "-u", help="Only show messages that mention this user")
+
+        # Subcommand for searching messages
+        search_parser = subparsers.add_parser("search", help="Search sent messages")
+        search_parser.add_argument("query", nargs="+", help="Words to search for")
+        search_parser.add_argument("--limit", "-n", type=positive_int, default=20,
+                                   help="The most results to show (defaults to 20)")
+
+        # Subcommand for loading the user directory
+        importusers_parser = subparsers.add_parser("importusers", help="Load Discord user ids from a JSON or CSV file")
+        importusers_parser.add_argument("file_path", help="A JSON or CSV export of user names and ids")
+
+        # Subcommands for history retention
+        retention_parser = subparsers.add_parser("retention", help="Show or set how much message history to keep")
+        retention_parser.add_argument("--max-age", type=duration_seconds,
+                                      help="Prune messages older than this, e.g. 30d or 12h")
+        retention_parser.add_argument("--max-messages", type=positive_int, help="Keep at most this many messages")
+        retention_parser.add_argument("--max-size", type=positive_int, dest="max_size_mb",
+                                      help="Keep the history database under this many megabytes")
+        retention_parser.add_argument("--clear", action="store_true", help="Remove all retention rules")
+        subparsers.add_parser("prune", help="Apply the retention rules to the whole history now")
 
         # Subcommand for setting a custom username
         setuser_parser = subparsers.add_parser("setuser", help="Set a custom username")
@@ -395,27 +2303,101 @@ def main():
         importconfig_parser.add_argument("file_path", nargs="?", default=os.path.expanduser("~/dissconfig.json"),
                                        help="The file path to import the configuration from (defaults to ~/dissconfig.json)")
 
+        # Subcommands for hook groups
+        tag_parser = subparsers.add_parser("tag", help="Add a hook to one or more groups")
+        tag_parser.add_argument("name", help="The hook name")
+        tag_parser.add_argument("groups", nargs="+", help="The groups to add it to")
+        untag_parser = subparsers.add_parser("untag", help="Remove a hook from one or more groups")
+        untag_parser.add_argument("name", help="The hook name")
+        untag_parser.add_argument("groups", nargs="+", help="The groups to remove it from")
+        subparsers.add_parser("groups", help="List hook groups and their hooks")
+
+        # Subcommand for holding back repeated messages
+        dedup_parser = subparsers.add_parser("dedup", help="Show or set how long a hook holds back repeats of a message")
+        dedup_parser.add_argument("name", nargs="?", help="The hook name")
+        dedup_parser.add_argument("window", nargs="?", help="A duration such as 10m, or 'off'")
+
+        # Subcommand for sending many messages from a file
+        send_parser = subparsers.add_parser("send", help="Send the messages in a JSONL file")
+        send_parser.add_argument("--from", dest="from_file", required=True, metavar="FILE",
+                                 help='JSON Lines of {"hook", "content", "username", "avatar_url"} records, or - for stdin')
+        send_parser.add_argument("--concurrency", "-c", type=positive_int, default=DEFAULT_BROADCAST_CONCURRENCY,
+                                 help=f"How many webhooks to post to at once (defaults to {DEFAULT_BROADCAST_CONCURRENCY})")
+        send_parser.add_argument("--dry-run", action="store_true", help="Only check the records")
+
+        # Subcommand for choosing where the configuration is kept
+        configstore_parser = subparsers.add_parser("configstore", help="Show or change where the configuration is stored")
+        configstore_parser.add_argument("store", nargs="?", choices=["db", "file"],
+                                        help="'db' to keep it in the history database, 'file' for the config file")
+
+        # Subcommands for moving message history between machines
+        exporthistory_parser = subparsers.add_parser("exporthistory", help="Export message history to a file")
+        exporthistory_parser.add_argument("file_path", help="The file to write, e.g. history.jsonl, history.csv or history.jsonl.gz")
+        exporthistory_parser.add_argument("--format", choices=["jsonl", "csv"], dest="history_format",
+                                          help="File format (defaults to the file extension, or jsonl)")
+
+        importhistory_parser = subparsers.add_parser("importhistory", help="Import message history from a file")
+        importhistory_parser.add_argument("file_path", help="A file written by 'diss exporthistory'")
+        importhistory_parser.add_argument("--format", choices=["jsonl", "csv"], dest="history_format",
+                                          help="File format (defaults to the file extension, or jsonl)")
+
         # Subcommand for broadcast
         broadcast_parser = subparsers.add_parser("broadcast", aliases=["b"], help="Send message to all webhooks")
         broadcast_parser.add_argument("message", nargs="?", help="The message to broadcast to all webhooks")
+        broadcast_parser.add_argument("--concurrency", "-c", type=positive_int, default=DEFAULT_BROADCAST_CONCURRENCY,
+                                      help=f"How many webhooks to post to at once (defaults to {DEFAULT_BROADCAST_CONCURRENCY})")
+
+        # Subcommand for retrying queued messages
+        flush_parser = subparsers.add_parser("flush", help="Retry messages waiting in the outbox and send due digests")
+        flush_parser.add_argument("--all", action="store_true", dest="ignore_backoff",
+                                  help="Retry every queued message and send every digest now, even those still waiting")
+
+        # Subcommand for running the resident sender
+        daemon_parser = subparsers.add_parser("daemon", help="Run a resident sender that plain sends hand off to")
+        daemon_parser.add_argument("--socket", dest="socket_path", default=SOCKET_PATH,
+                                   help=f"The Unix socket to listen on (defaults to {SOCKET_PATH})")
 
         args = parser.parse_args()
         
         # Handle piped input for broadcast command
-        if args.command in ["broadcast", "b"] and not args.message and piped_message:
-            args.message = piped_message
+        if args.command in ["broadcast", "b"] and not args.message:
+            args.message = handle_piped_input()
         
         # Only set message to None if we're not using a subcommand that needs it
         if not args.command or args.command not in ["broadcast", "b"]:
             args.message = None
+    elif len(sys.argv) > 1 and not any(arg.startswith("-") for arg in sys.argv[1:]):
+        # Fast path for the common `diss "message"` case: there are no
+        # options for argparse to interpret, so skip building a parser
+        args = SimpleNamespace(command=None, message=handle_piped_input() or " ".join(sys.argv[1:]))
     else:
         # If no subcommand is provided, treat all arguments as a potential message
+        import argparse
         parser = argparse.ArgumentParser(description="Send messages to Discord via webhooks.")
         parser.add_argument("message", nargs="*", help="The message to send")
+        parser.add_argument("--follow", "-f", action="store_true",
+                            help="Keep reading stdin and send lines as they arrive, e.g. tail -f app.log | diss -f")
+        parser.add_argument("--window", type=positive_float, default=FOLLOW_WINDOW,
+                            help=f"With --follow, seconds to gather lines into one message (defaults to {FOLLOW_WINDOW:g})")
+        parser.add_argument("--max-size", type=positive_int, default=FOLLOW_MAX_SIZE,
+                            help=f"With --follow, characters to gather before sending early (defaults to {FOLLOW_MAX_SIZE})")
+        parser.add_argument("--group", "-g", help="Send to every hook in this group instead of the default hook")
+        parser.add_argument("--concurrency", "-c", type=positive_int, default=DEFAULT_BROADCAST_CONCURRENCY,
+                            help=f"With --group, how many webhooks to post to at once (defaults to {DEFAULT_BROADCAST_CONCURRENCY})")
+        parser.add_argument("--digest", type=duration_seconds, metavar="WINDOW",
+                            help="Collect the message into a digest sent once the window, e.g. 10m, has passed")
+        parser.add_argument("--head", type=positive_int, default=PIPE_HEAD_KB,
+                            help=f"Kilobytes of piped input to keep from the start (defaults to {PIPE_HEAD_KB})")
+        parser.add_argument("--tail", type=positive_int, default=PIPE_TAIL_KB,
+                            help=f"Kilobytes of piped input to keep from the end (defaults to {PIPE_TAIL_KB})")
         
         try:
             args = parser.parse_args()
-            if piped_message:
+            # Read piped input now, unless --follow is going to stream it
+            piped_message = None if args.follow else handle_piped_input(args.head, args.tail)
+            if args.follow:
+                args.message = None
+            elif piped_message:
                 args.message = piped_message
             elif args.message:
                 args.message = " ".join(args.message)
@@ -423,7 +2405,10 @@ def main():
                 args.message = None
                 print_help_message()
                 return
-            args.command = None
+            if args.follow:
+                args.command = "follow"
+            else:
+                args.command = "digest" if args.digest else "group" if args.group else None
         except SystemExit:
             # This happens when parsing fails
             args = argparse.Namespace()
@@ -433,7 +2418,47 @@ def main():
             print('Example: diss "your message here"')
             return
 
-    config = load_config()
+    if args.command is None and args.message:
+        # A running daemon takes plain sends without this process touching
+        # the database or the network
+        reply = send_via_daemon(args.message)
+        if reply is not None:
+            if not reply.get("ok"):
+                print(f"Error: {reply.get('error')}")
+            elif reply.get("repeat"):
+                print(REPEAT_NOTICE)
+            return
+
+        # Default behavior: send a message
+        target = resolve_default_target()
+        if not target:
+            print_no_webhook_error()
+            return
+
+        webhook_url, username, avatar_url = target
+        if send_message(webhook_url, username, avatar_url, args.message):
+            # The network is up, so drain a few earlier messages still waiting for a retry
+            flush_outbox(limit=OUTBOX_CLI_BATCH)
+            flush_digests()
+        enforce_retention()
+        # Sending wrote to the database; re-stamp the cache so the next run
+        # still trusts it. The target is looked up again rather than reused,
+        # in case a hook changed while the message was in flight.
+        refresh_resolution_cache()
+        print_outbox_notice()
+        return
+
+    init_db()
+
+    if args.command == "follow":
+        target = resolve_default_target()
+        if not target:
+            print_no_webhook_error()
+            return
+        webhook_url, username, avatar_url = target
+        follow_input(sys.stdin, webhook_url, username, avatar_url, args.window, args.max_size)
+        print_outbox_notice()
+        return
 
     if args.command == "addhook":
         add_hook(args.name, args.webhook)
@@ -460,13 +2485,32 @@ def main():
         return
 
     if args.command == "list":
-        messages = list_messages()
-        for message, mentions in messages:
-            print(f"Message: {message}")
+        print_messages(iter_messages(args.limit, args.since, args.hook, args.reverse, args.user))
+        return
+
+    if args.command == "search":
+        query = " ".join(args.query)
+        results = search_messages(query, args.limit)
+        if not results:
+            print(f"No messages found matching '{query}'.")
+        for message_id, snippet, mentions in results:
+            print(f"[{message_id}] {snippet}")
             if mentions:
                 print(f"Mentions: {mentions}")
         return
 
+    if args.command == "importusers":
+        import_users(args.file_path)
+        return
+
+    if args.command == "retention":
+        retention_command(args.max_age, args.max_messages, args.max_size_mb, args.clear)
+        return
+
+    if args.command == "prune":
+        prune_command()
+        return
+
     if args.command == "setuser":
         set_user(args.username)
         return
@@ -483,6 +2527,79 @@ def main():
         import_config(args.file_path)
         return
 
+    if args.command == "tag":
+        tag_hook(args.name, args.groups)
+        return
+
+    if args.command == "untag":
+        untag_hook(args.name, args.groups)
+        return
+
+    if args.command == "groups":
+        list_groups()
+        return
+
+    if args.command == "digest":
+        if args.group:
+            webhook_urls = [url for (url,) in get_group_webhooks(args.group)]
+            if not webhook_urls:
+                print(f"Error: No hooks in group '{args.group}'. Use 'diss tag <hook> {args.group}' to add some.")
+                return
+        else:
+            webhook_url = get_default_hook_url()
+            if not webhook_url:
+                print_no_webhook_error()
+                return
+            webhook_urls = [webhook_url]
+        from datetime import datetime
+        due_at = min(add_to_digest(webhook_urls, args.message, args.digest))
+        print(f"Added to the digest, which goes out at {datetime.fromtimestamp(due_at):%H:%M:%S}.")
+        flush_digests()
+        return
+
+    if args.command == "group":
+        send_to_group(args.group, args.message, load_config().get("username"), args.concurrency)
+        enforce_retention()
+        return
+
+    if args.command == "dedup":
+        if args.name is None:
+            list_dedup_windows()
+        elif args.window is None:
+            print("Error: Give a window such as 10m, or 'off'.")
+        elif args.window.lower() == "off":
+            set_dedup_window(args.name, None)
+        else:
+            try:
+                window = parse_duration(args.window)
+            except ValueError:
+                print(f"Error: '{args.window}' is not a duration like 10m or 1h.")
+                return
+            set_dedup_window(args.name, window if window > 0 else None)
+        return
+
+    if args.command == "send":
+        send_from_file(args.from_file, args.concurrency, args.dry_run)
+        enforce_retention()
+        return
+
+    if args.command == "configstore":
+        if args.store:
+            move_config(args.store)
+        elif config_store() == "db":
+            print(f"Configuration is stored in the history database '{DB_PATH}'.")
+        else:
+            print(f"Configuration is stored in '{CONFIG_PATH}'.")
+        return
+
+    if args.command == "exporthistory":
+        export_history(args.file_path, args.history_format)
+        return
+
+    if args.command == "importhistory":
+        import_history(args.file_path, args.history_format)
+        return
+
     if args.command == "deletehook":
         delete_hook(args.name)
         return
@@ -491,25 +2608,24 @@ def main():
         delete_logs()
         return
 
-    if args.command == "broadcast":
-        config = load_config()
-        username = config.get("username")
-        broadcast_message(args.message, username)
+    if args.command == "daemon":
+        from disscli.daemon import run_daemon
+        run_daemon(args.socket_path)
         return
 
-    if args.message:
-        # Default behavior: send a message
-        webhook_url = get_hook_url(get_default_hook())
-
-        if not webhook_url:
-            print("Error: No webhook configured. Either:")
-            print("  1. Use 'addhook' to add one and 'hook' to set it as default.")
-            return
-
-        username = config.get("username", "DissBot")
-        avatar_url = config.get("avatar_url")
+    if args.command == "flush":
+        digests = flush_digests(args.ignore_backoff)
+        if digests:
+            print(f"Sent {digests} digests.")
+        flush_command(args.ignore_backoff)
+        enforce_retention()
+        return
 
-        send_message(webhook_url, username, avatar_url, args.message)
+    if args.command == "broadcast":
+        config = load_config()
+        username = config.get("username")
+        broadcast_message(args.message, username, args.concurrency)
+        enforce_retention(config)
         return
 
     if args.message is None:
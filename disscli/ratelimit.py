@@ -0,0 +1,149 @@
+import threading
+import time
+
+# Discord reports rate limits per "bucket". Several webhook routes can share a
+# bucket, and the bucket id is only known after the first response, so routes
+# start out keyed by their URL and move to the shared bucket once it is seen.
+# https://discord.com/developers/docs/topics/rate-limits
+
+DEFAULT_MAX_RETRIES = 3
+
+
+class _Bucket:
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset_at = 0.0
+
+
+def _header(headers, name):
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitScheduler:
+    def __init__(self, max_retries=DEFAULT_MAX_RETRIES, clock=time.monotonic, sleep=time.sleep):
+        self.max_retries = max_retries
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._route_buckets = {}
+        self._buckets = {}
+        self._global_reset_at = 0.0
+
+        # Counters
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.sends = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.rate_limited = 0
+
+    def _bucket_for(self, route):
+        key = self._route_buckets.get(route, route)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket()
+        return bucket
+
+    def _reserve(self, route):
+        # Take a token from the route's bucket, or return how long to wait for one
+        now = self._clock()
+        if now < self._global_reset_at:
+            return self._global_reset_at - now
+
+        bucket = self._bucket_for(route)
+        if now >= bucket.reset_at and bucket.limit is not None:
+            bucket.remaining = bucket.limit
+        if bucket.remaining is None:
+            # Nothing known about this bucket yet
+            return 0.0
+        if bucket.remaining > 0:
+            bucket.remaining -= 1
+            return 0.0
+        return max(bucket.reset_at - now, 0.0)
+
+    def acquire(self, route):
+        with self._lock:
+            delay = self._reserve(route)
+            if delay <= 0:
+                return 0.0
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+        waited = 0.0
+        try:
+            while delay > 0:
+                self._sleep(delay)
+                waited += delay
+                with self._lock:
+                    delay = self._reserve(route)
+        finally:
+            with self._lock:
+                self.queue_depth -= 1
+                self.waits += 1
+                self.wait_time += waited
+        return waited
+
+    def update(self, route, headers, status_code=None):
+        now = self._clock()
+        with self._lock:
+            bucket_id = headers.get("X-RateLimit-Bucket")
+            if bucket_id:
+                key = self._route_buckets.get(route, route)
+                if key != bucket_id:
+                    # Move the route's state over to the shared bucket
+                    self._route_buckets[route] = bucket_id
+                    previous = self._buckets.pop(key, None) if key == route else None
+                    if bucket_id not in self._buckets:
+                        self._buckets[bucket_id] = previous or _Bucket()
+
+            bucket = self._bucket_for(route)
+            limit = _header(headers, "X-RateLimit-Limit")
+            remaining = _header(headers, "X-RateLimit-Remaining")
+            reset_after = _header(headers, "X-RateLimit-Reset-After")
+            if limit is not None:
+                bucket.limit = int(limit)
+            if remaining is not None:
+                bucket.remaining = int(remaining)
+            if reset_after is not None:
+                bucket.reset_at = now + reset_after
+
+            if status_code == 429:
+                self.rate_limited += 1
+                retry_after = _header(headers, "Retry-After") or reset_after or 1.0
+                if str(headers.get("X-RateLimit-Global", "")).lower() == "true":
+                    self._global_reset_at = now + retry_after
+                else:
+                    bucket.remaining = 0
+                    bucket.reset_at = now + retry_after
+
+    def send(self, route, request):
+        # Run request() once the route has a token, learning from the response
+        # headers, and retry after the advertised delay when Discord answers 429
+        attempt = 0
+        while True:
+            self.acquire(route)
+            response = request()
+            with self._lock:
+                self.sends += 1
+            self.update(route, response.headers, response.status_code)
+            if response.status_code != 429 or attempt >= self.max_retries:
+                return response
+            attempt += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "sends": self.sends,
+                "waits": self.waits,
+                "wait_time": self.wait_time,
+                "rate_limited": self.rate_limited,
+            }
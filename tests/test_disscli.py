@@ -15,7 +15,9 @@ class TestDiscordCLI(unittest.TestCase):
         # Create test environment
         patcher = patch.dict('os.environ', {
             'DISSCLI_CONFIG_PATH': os.path.join(self.test_dir, 'test_config.json'),
-            'DISSCLI_DB_PATH': os.path.join(self.test_dir, 'test_db.sqlite')
+            'DISSCLI_DB_PATH': os.path.join(self.test_dir, 'test_db.sqlite'),
+            'DISSCLI_CACHE_PATH': os.path.join(self.test_dir, 'test_cache.json'),
+            'DISSCLI_SOCKET_PATH': os.path.join(self.test_dir, 'test.sock')
         })
         patcher.start()
         self.addCleanup(patcher.stop)
@@ -138,8 +140,9 @@ class TestDiscordCLI(unittest.TestCase):
         set_default_hook("test_hook")
         
         # Mock the HTTP request
-        with patch('requests.post') as mock_post:
+        with patch('requests.Session.post') as mock_post:
             mock_post.return_value.status_code = 204
+            mock_post.return_value.headers = {}
             
             # Send a test message
             send_message("http://test.webhook.url", "test_user", None, "Test message")
@@ -150,7 +153,6 @@ class TestDiscordCLI(unittest.TestCase):
                 json={
                     "content": "Test message",
                     "username": "test_user",
-                    "avatar_url": None,
                 }
             )
         
@@ -188,5 +190,1292 @@ class TestDiscordCLI(unittest.TestCase):
             set_default_hook("non_existent_hook")
             mock_print.assert_called_with("Error: No hook found with the name 'non_existent_hook'.")
 
+    def test_broadcast_message(self):
+        """Test that broadcast posts to hooks concurrently and tallies results"""
+        # Import after environment is set up
+        from disscli.main import (
+            init_db,
+            add_hook,
+            broadcast_message,
+            get_db_connection
+        )
+        import threading
+        import time
+
+        # Initialize database
+        init_db()
+
+        # Clear any existing data
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM messages")
+            cursor.execute("DELETE FROM hooks")
+            cursor.execute("DELETE FROM outbox")
+
+        for i in range(4):
+            add_hook(f"hook{i}", f"http://test{i}.webhook.url")
+
+        in_flight = []
+        peak = []
+        lock = threading.Lock()
+
+        def fake_post(url, json=None):
+            with lock:
+                in_flight.append(url)
+                peak.append(len(in_flight))
+            time.sleep(0.05)
+            with lock:
+                in_flight.remove(url)
+            response = MagicMock()
+            response.status_code = 500 if url == "http://test3.webhook.url" else 204
+            response.headers = {}
+            return response
+
+        with patch('requests.Session.post', side_effect=fake_post), patch('builtins.print') as mock_print:
+            broadcast_message("Hello everyone", "test_user", concurrency=2)
+            mock_print.assert_any_call("Message broadcast to 3/4 webhooks successfully!")
+            # The failed send should be kept for a retry
+            mock_print.assert_called_with("1 messages are waiting in the outbox. Run 'diss flush' to retry them.")
+
+        # No more than the requested number of sends should run at once
+        self.assertEqual(max(peak), 2)
+
+    def test_http_session_reuse(self):
+        """Test that sends share one pooled HTTP session"""
+        # Import after environment is set up
+        from disscli.main import get_http_session, close_http_session
+
+        close_http_session()
+        self.addCleanup(close_http_session)
+
+        session = get_http_session()
+        self.assertIs(get_http_session(), session)
+
+        # Both schemes should go through the sized pool adapter
+        adapter = session.get_adapter("https://discord.com/api/webhooks/1/abc")
+        self.assertIs(session.get_adapter("http://localhost:8000/"), adapter)
+
+        # Closing the session should give the next caller a fresh one
+        close_http_session()
+        self.assertIsNot(get_http_session(), session)
+
+    def test_rate_limit_scheduler(self):
+        """Test that the scheduler waits out exhausted buckets and 429s"""
+        from disscli.ratelimit import RateLimitScheduler
+
+        now = [100.0]
+        sleeps = []
+
+        def fake_sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        scheduler = RateLimitScheduler(clock=lambda: now[0], sleep=fake_sleep)
+        route = "http://test.webhook.url"
+
+        def respond(status_code, headers):
+            response = MagicMock()
+            response.status_code = status_code
+            response.headers = headers
+            return response
+
+        # A bucket with tokens left should not delay the next send
+        scheduler.send(route, lambda: respond(204, {
+            "X-RateLimit-Bucket": "abc",
+            "X-RateLimit-Limit": "5",
+            "X-RateLimit-Remaining": "1",
+            "X-RateLimit-Reset-After": "2",
+        }))
+        scheduler.send(route, lambda: respond(204, {
+            "X-RateLimit-Bucket": "abc",
+            "X-RateLimit-Limit": "5",
+            "X-RateLimit-Remaining": "0",
+            "X-RateLimit-Reset-After": "1.5",
+        }))
+        self.assertEqual(sleeps, [])
+
+        # An exhausted bucket should wait just until it resets
+        scheduler.send(route, lambda: respond(204, {}))
+        self.assertEqual(sleeps, [1.5])
+
+        # A 429 should be retried after Retry-After instead of failing
+        responses = iter([
+            respond(429, {"Retry-After": "3", "X-RateLimit-Bucket": "abc"}),
+            respond(204, {"X-RateLimit-Bucket": "abc"}),
+        ])
+        response = scheduler.send(route, lambda: next(responses))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(sleeps, [1.5, 3.0])
+
+        stats = scheduler.stats()
+        self.assertEqual(stats["sends"], 5)
+        self.assertEqual(stats["waits"], 2)
+        self.assertEqual(stats["rate_limited"], 1)
+        self.assertEqual(stats["wait_time"], 4.5)
+        self.assertEqual(stats["queue_depth"], 0)
+
+    def test_outbox_retry(self):
+        """Test that failed sends wait in the outbox until they are delivered"""
+        # Import after environment is set up
+        from disscli.main import (
+            init_db,
+            send_message,
+            flush_outbox,
+            count_outbox,
+            list_messages,
+            get_db_connection,
+            OUTBOX_SENT
+        )
+        import requests
+        import time
+
+        # Initialize database
+        init_db()
+
+        # Clear any existing data
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM messages")
+            cursor.execute("DELETE FROM outbox")
+
+        # A network failure should queue the message, not lose it
+        with patch('requests.Session.post', side_effect=requests.exceptions.ConnectionError("offline")), \
+                patch('builtins.print'):
+            self.assertFalse(send_message("http://test.webhook.url", "test_user", None, "Queued message"))
+        self.assertEqual(count_outbox(), 1)
+        self.assertEqual(len(list_messages()), 0)
+
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT attempts, next_attempt_at FROM outbox")
+            attempts, next_attempt_at = cursor.fetchone()
+        self.assertEqual(attempts, 1)
+        self.assertGreater(next_attempt_at, time.time())
+
+        # The message is still backing off, so a plain flush should skip it
+        with patch('requests.Session.post') as mock_post:
+            self.assertEqual(flush_outbox(), {})
+            mock_post.assert_not_called()
+
+        # Once it is retried successfully it moves into the history
+        with patch('requests.Session.post') as mock_post:
+            mock_post.return_value.status_code = 204
+            mock_post.return_value.headers = {}
+            statuses = flush_outbox(ignore_backoff=True)
+        self.assertEqual(list(statuses.values()), [OUTBOX_SENT])
+        self.assertEqual(count_outbox(), 0)
+        self.assertEqual(list_messages()[0][0], "Queued message")
+
+        # Two drainers running at once must not both post the same message
+        from disscli.main import enqueue_message
+        import threading
+        enqueue_message("http://test.webhook.url", "test_user", None, "Raced message")
+        posts = []
+
+        def slow_post(url, json=None):
+            posts.append(json["content"])
+            time.sleep(0.2)
+            response = MagicMock(status_code=204, headers={})
+            return response
+
+        with patch('requests.Session.post', side_effect=slow_post):
+            drainers = [threading.Thread(target=flush_outbox) for _ in range(2)]
+            for drainer in drainers:
+                drainer.start()
+            for drainer in drainers:
+                drainer.join()
+        self.assertEqual(posts, ["Raced message"])
+        self.assertEqual(count_outbox(), 0)
+        self.assertEqual([row[0] for row in list_messages()].count("Raced message"), 1)
+
+        # A plain send's own entries are claimed while it posts them
+        ids = enqueue_message("http://test.webhook.url", "test_user", None, "Own message", claim=True)
+        with patch('requests.Session.post') as mock_post:
+            self.assertEqual(flush_outbox(), {})
+            mock_post.assert_not_called()
+            mock_post.return_value.status_code = 204
+            mock_post.return_value.headers = {}
+            self.assertEqual(flush_outbox(ids=ids, ignore_backoff=True), {ids[0]: OUTBOX_SENT})
+
+    def test_daemon_handoff(self):
+        """Test that plain sends can be handed to a running daemon"""
+        # Import after environment is set up
+        from disscli.main import (
+            init_db,
+            add_hook,
+            send_via_daemon,
+            send_message,
+            count_outbox,
+            list_messages,
+            get_db_connection
+        )
+        from disscli.daemon import DissDaemon
+        import threading
+        import time
+
+        # Initialize database
+        init_db()
+
+        # Clear any existing data
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM messages")
+            cursor.execute("DELETE FROM hooks")
+            cursor.execute("DELETE FROM outbox")
+
+        socket_path = os.path.join(self.test_dir, 'diss.sock')
+
+        # Without a daemon the caller is told to send directly
+        self.assertIsNone(send_via_daemon("Hello", socket_path))
+
+        with patch('builtins.print'):
+            add_hook("test_hook", "http://test.webhook.url")
+
+        posts = []
+
+        def slow_post(url, json=None):
+            posts.append(json["content"])
+            time.sleep(0.2)
+            return MagicMock(status_code=204, headers={})
+
+        # Every connection the daemon opens, by the thread that opened it
+        connecting_threads = []
+        real_connect = sqlite3.connect
+
+        def record_connect(*args, **kwargs):
+            connecting_threads.append(threading.current_thread().name)
+            return real_connect(*args, **kwargs)
+
+        with patch('requests.Session.post', side_effect=slow_post), \
+                patch('sqlite3.connect', side_effect=record_connect):
+            server = DissDaemon(socket_path, flush_interval=0.01)
+            thread = threading.Thread(target=server.serve)
+            thread.start()
+            try:
+                reply = send_via_daemon("Hello from CI", socket_path)
+                self.assertTrue(reply["ok"])
+                self.assertTrue(send_via_daemon("Hello again", socket_path)["ok"])
+
+                # The daemon's sender thread delivers the queued message
+                deadline = time.time() + 5
+                while count_outbox() and time.time() < deadline:
+                    time.sleep(0.01)
+
+                # A direct send while the daemon is running is posted once,
+                # by the process that queued it
+                self.assertTrue(send_message("http://test.webhook.url", "test_user", None, "Sent directly"))
+            finally:
+                server.stop()
+                server.server_close()
+                thread.join()
+
+        self.assertEqual(posts, ["Hello from CI", "Hello again", "Sent directly"])
+        self.assertEqual(count_outbox(), 0)
+        self.assertEqual([row[0] for row in list_messages()], ["Hello from CI", "Hello again", "Sent directly"])
+        self.assertFalse(os.path.exists(socket_path))
+        # Requests are queued by the sender thread on one long-lived
+        # connection, not one per client connection
+        self.assertEqual(connecting_threads, ["disscli-daemon-sender"])
+
+    def test_broadcast_group_commit(self):
+        """Test that a broadcast reuses one connection and commits its history together"""
+        # Import after environment is set up
+        from disscli.main import (
+            init_db,
+            add_hook,
+            broadcast_message,
+            list_messages,
+            get_db_connection
+        )
+
+        # Initialize database
+        init_db()
+
+        # Clear any existing data
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM messages")
+            cursor.execute("DELETE FROM hooks")
+            cursor.execute("DELETE FROM outbox")
+
+        # The process should keep using the same connection
+        conn = get_db_connection()
+        self.assertIs(get_db_connection(), conn)
+
+        with patch('builtins.print'):
+            for i in range(5):
+                add_hook(f"hook{i}", f"http://test{i}.webhook.url")
+
+        statements = []
+        conn.set_trace_callback(statements.append)
+        self.addCleanup(conn.set_trace_callback, None)
+
+        with patch('requests.Session.post') as mock_post, patch('builtins.print'):
+            mock_post.return_value.status_code = 204
+            mock_post.return_value.headers = {}
+            broadcast_message("Hello everyone", "test_user")
+
+        self.assertEqual(len(list_messages()), 5)
+        # One commit to queue the copies and one to record the results,
+        # however many hooks there are
+        self.assertEqual(statements.count("COMMIT"), 2)
+
+    def test_resolution_cache(self):
+        """Test that the default send target is cached until the DB or config changes"""
+        # Import after environment is set up
+        from disscli.main import (
+            init_db,
+            add_hook,
+            set_default_hook,
+            save_config,
+            resolve_default_target,
+            refresh_resolution_cache,
+            invalidate_resolution_cache,
+            get_db_connection
+        )
+        import disscli.main
+
+        # Initialize database
+        init_db()
+
+        # Clear any existing data
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM hooks")
+        invalidate_resolution_cache()
+
+        with patch('builtins.print'):
+            add_hook("test_hook", "http://test.webhook.url")
+            add_hook("test_hook2", "http://test2.webhook.url")
+        save_config({"username": "test_user"})
+
+        self.assertEqual(resolve_default_target(), ("http://test.webhook.url", "test_user", None))
+
+        # Nothing changed, so the answer should come from the cache
+        with patch.object(disscli.main, 'get_default_hook_url') as mock_lookup:
+            self.assertEqual(resolve_default_target(), ("http://test.webhook.url", "test_user", None))
+            mock_lookup.assert_not_called()
+
+        # Changing the default hook or the config should be picked up
+        with patch('builtins.print'):
+            set_default_hook("test_hook2")
+        self.assertEqual(resolve_default_target(), ("http://test2.webhook.url", "test_user", None))
+
+        save_config({"username": "renamed_user", "avatar_url": "http://avatar.url"})
+        self.assertEqual(resolve_default_target(), ("http://test2.webhook.url", "renamed_user", "http://avatar.url"))
+
+        # Re-stamping after a send must not bring back a default hook that
+        # another process changed while the message was in flight
+        with patch('builtins.print'):
+            set_default_hook("test_hook")
+        refresh_resolution_cache()
+        self.assertEqual(resolve_default_target(), ("http://test.webhook.url", "renamed_user", "http://avatar.url"))
+
+    def test_message_chunking(self):
+        """Test that oversized messages are split into well-formed chunks"""
+        # Import after environment is set up
+        from disscli.main import (
+            init_db,
+            send_message,
+            split_message,
+            list_messages,
+            get_db_connection,
+            DISCORD_MESSAGE_LIMIT
+        )
+
+        # Short messages should be left alone
+        self.assertEqual(split_message("Hello"), ["Hello"])
+
+        # A long code block should be split on line boundaries, with the
+        # fence closed and re-opened around every chunk
+        lines = [f"line {i} " + "x" * 40 for i in range(1000)]
+        log = "```text\n" + "\n".join(lines) + "\n```"
+        chunks = split_message(log)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), DISCORD_MESSAGE_LIMIT)
+            self.assertTrue(chunk.startswith("```text\n"))
+            self.assertTrue(chunk.endswith("\n```"))
+        body = [line for chunk in chunks for line in chunk.split("\n")[1:-1]]
+        self.assertEqual(body, lines)
+
+        # A single line longer than the limit should still be cut to fit
+        chunks = split_message("y" * 4500)
+        self.assertEqual([len(chunk) for chunk in chunks], [2000, 2000, 500])
+
+        # Initialize database
+        init_db()
+
+        # Clear any existing data
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM messages")
+            cursor.execute("DELETE FROM outbox")
+
+        # The chunks should be posted in order
+        with patch('requests.Session.post') as mock_post:
+            mock_post.return_value.status_code = 204
+            mock_post.return_value.headers = {}
+            self.assertTrue(send_message("http://test.webhook.url", None, None, log))
+            sent = [kwargs["json"]["content"] for args, kwargs in mock_post.call_args_list]
+        self.assertEqual(sent, split_message(log))
+        self.assertEqual(len(list_messages()), len(sent))
+
+    def test_follow_input(self):
+        """Test that streamed lines are gathered into time and size windows"""
+        # Import after environment is set up
+        from disscli.main import follow_input
+        import time
+
+        def slow_stream():
+            yield "first\n"
+            yield "second\n"
+            # Pause long enough for the first window to close
+            time.sleep(0.3)
+            yield "third\n"
+
+        with patch('disscli.main.send_message', return_value=True) as mock_send:
+            sent = follow_input(slow_stream(), "http://test.webhook.url", "test_user", None, window=0.1)
+        self.assertEqual(sent, 2)
+        self.assertEqual([args[3] for args, kwargs in mock_send.call_args_list], [
+            "```\nfirst\nsecond\n```",
+            "```\nthird\n```",
+        ])
+
+        # Reaching the size cap should send without waiting for the window
+        stream = [f"line {i}\n" for i in range(6)]
+        with patch('disscli.main.send_message', return_value=True) as mock_send:
+            follow_input(iter(stream), "http://test.webhook.url", None, None, window=60, max_size=15)
+        self.assertEqual([args[3] for args, kwargs in mock_send.call_args_list], [
+            "```\nline 0\nline 1\n```",
+            "```\nline 2\nline 3\n```",
+            "```\nline 4\nline 5\n```",
+        ])
+
+    def test_bounded_piped_input(self):
+        """Test that huge piped input keeps only its head and tail"""
+        # Import after environment is set up
+        from disscli.main import read_bounded
+        import io
+
+        lines = [f"line {i}" for i in range(100000)]
+        data = ("\n".join(lines) + "\n").encode()
+
+        # Small input should come through untouched
+        text, omitted_lines, omitted_bytes = read_bounded(io.BytesIO(b"a\nb\n"), 1024, 1024)
+        self.assertEqual((text, omitted_lines, omitted_bytes), ("a\nb\n", 0, 0))
+
+        text, omitted_lines, omitted_bytes = read_bounded(io.BytesIO(data), 1024, 1024, chunk_size=4096)
+        kept = text.split("\n")
+        marker = [line for line in kept if "omitted" in line]
+        self.assertEqual(len(marker), 1)
+
+        # Whole lines should be kept on both sides, and the counts should
+        # account for exactly what is missing
+        head = kept[:kept.index(marker[0])]
+        tail = kept[kept.index(marker[0]) + 1:-1]
+        self.assertEqual(head, lines[:len(head)])
+        self.assertEqual(tail, lines[-len(tail):])
+        self.assertEqual(omitted_lines, len(lines) - len(head) - len(tail))
+        self.assertEqual(omitted_bytes, len(data) - len("\n".join(head + tail)) - 1)
+        self.assertEqual(marker[0], f"… {omitted_lines:,} lines omitted ({omitted_bytes:,} bytes) …")
+        self.assertLess(len(text), 3000)
+
+    def test_search_messages(self):
+        """Test full-text search over the message history"""
+        # Import after environment is set up
+        from disscli.main import (
+            init_db,
+            save_message,
+            search_messages,
+            delete_logs,
+            get_db_connection
+        )
+
+        # Initialize database
+        init_db()
+
+        # Clear any existing data
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM messages")
+
+        # Messages stored before the index existed should be backfilled
+        save_message("Deploy finished on staging", [])
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DROP TABLE messages_fts")
+            cursor.execute("DROP TRIGGER messages_fts_insert")
+            cursor.execute("DROP TRIGGER messages_fts_delete")
+            cursor.execute("DROP TRIGGER messages_fts_update")
+            cursor.execute("PRAGMA user_version = 1")
+        with patch('builtins.print'):
+            init_db()
+
+        # New messages should be indexed as they are saved
+        save_message("Deploy failed on production @oncall", ["@oncall"])
+        save_message("Lunch is ready", [])
+
+        results = search_messages("deploy")
+        self.assertEqual(len(results), 2)
+        self.assertIn("**Deploy**", results[0][1])
+        self.assertEqual(len(search_messages("deploy", limit=1)), 1)
+
+        production = search_messages("production")
+        self.assertEqual(len(production), 1)
+        self.assertEqual(production[0][2], "@oncall")
+
+        # Queries that aren't valid FTS syntax should still work
+        self.assertEqual(len(search_messages("deploy-failed")), 1)
+
+        # Deleted messages should drop out of the index
+        with patch('builtins.print'):
+            delete_logs()
+        self.assertEqual(search_messages("deploy"), [])
+
+    def test_iter_messages(self):
+        """Test filtered, paginated listing of the message history"""
+        # Import after environment is set up
+        from disscli.main import (
+            init_db,
+            save_message,
+            iter_messages,
+            parse_since,
+            get_db_connection
+        )
+        import time
+
+        # Initialize database
+        init_db()
+
+        # Clear any existing data
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM messages")
+
+        for i in range(10):
+            save_message(f"Message {i}", [], "alerts" if i % 2 else "builds")
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE messages SET sent_at = ? WHERE message IN ('Message 0', 'Message 1')",
+                           (time.time() - 7200,))
+
+        def listed(**filters):
+            return [row[1] for row in iter_messages(**filters)]
+
+        self.assertEqual(len(listed()), 10)
+        # The most recent messages, oldest first unless reversed
+        self.assertEqual(listed(limit=3), ["Message 7", "Message 8", "Message 9"])
+        self.assertEqual(listed(limit=3, reverse=True), ["Message 9", "Message 8", "Message 7"])
+        self.assertEqual(listed(hook="alerts", limit=2), ["Message 7", "Message 9"])
+        self.assertEqual(len(listed(since=parse_since("1h"))), 8)
+        self.assertEqual(listed(since=parse_since("1h"), hook="builds", reverse=True)[-1], "Message 2")
+
+        row = next(iter_messages(limit=1))
+        self.assertEqual(row[4], "alerts")
+        self.assertAlmostEqual(row[3], time.time(), delta=60)
+
+    def test_mentions_table(self):
+        """Test that mentions are stored one per row and counted in SQL"""
+        # Import after environment is set up
+        from disscli.main import (
+            init_db,
+            save_message,
+            get_mentioned_users,
+            iter_messages,
+            delete_logs,
+            get_db_connection
+        )
+
+        # Initialize database
+        init_db()
+
+        # Clear any existing data
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM messages")
+
+        # Mentions saved before the table existed should be migrated
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO messages (message, mentions) VALUES ('Old @alice @bob', '@alice,@bob')")
+            cursor.execute("DROP TABLE mentions")
+            cursor.execute("DROP TRIGGER mentions_delete")
+            cursor.execute("PRAGMA user_version = 3")
+        with patch('builtins.print'):
+            init_db()
+
+        save_message("Hello @alice", ["@alice"])
+        save_message("Hello @carol", ["@carol"])
+
+        users = get_mentioned_users()
+        self.assertEqual([(user, count) for user, count, last in users], [
+            ("@alice", 2),
+            ("@bob", 1),
+            ("@carol", 1),
+        ])
+
+        # Filtering by user should work with or without the @
+        self.assertEqual([row[1] for row in iter_messages(user="alice")], ["Old @alice @bob", "Hello @alice"])
+        self.assertEqual([row[1] for row in iter_messages(user="@carol")], ["Hello @carol"])
+
+        # Deleting the history should remove its mentions too
+        with patch('builtins.print'):
+            delete_logs()
+        self.assertEqual(get_mentioned_users(), [])
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM mentions")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_user_directory(self):
+        """Test that @name mentions are rewritten from the local user directory"""
+        # Import after environment is set up
+        from disscli.main import (
+            init_db,
+            import_users,
+            resolve_mentions,
+            extract_mentions,
+            reset_user_directory,
+            get_db_connection
+        )
+
+        # Initialize database
+        init_db()
+
+        # Clear any existing data
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM users")
+        reset_user_directory()
+        self.addCleanup(reset_user_directory)
+
+        # Without a directory, messages are left as they are
+        self.assertEqual(resolve_mentions("Hello @alice"), "Hello @alice")
+
+        json_path = os.path.join(self.test_dir, 'users.json')
+        with open(json_path, 'w') as f:
+            json.dump([{"name": "alice", "id": "111"}, {"name": "alice.b", "id": "222"}], f)
+        csv_path = os.path.join(self.test_dir, 'users.csv')
+        with open(csv_path, 'w') as f:
+            f.write("username,user_id\n@Bob,333\n")
+
+        with patch('builtins.print') as mock_print:
+            import_users(json_path)
+            mock_print.assert_called_with(f"Imported 2 users from '{json_path}'.")
+            import_users(csv_path)
+
+        self.assertEqual(resolve_mentions("Hi @alice, @Bob and @alice.b."), "Hi <@111>, <@333> and <@222>.")
+        # Unknown names, longer names and e-mail addresses are not mentions
+        self.assertEqual(resolve_mentions("@carol @alicex me@alice.com"), "@carol @alicex me@alice.com")
+
+        # History should still record the names that were mentioned
+        self.assertEqual(extract_mentions("Hi <@111> and @carol"), ["@alice", "@carol"])
+
+    def test_history_retention(self):
+        """Test pruning old history into a compressed archive"""
+        # Import after environment is set up
+        import gzip
+        import time
+        from disscli.main import (
+            init_db,
+            save_message,
+            list_messages,
+            prune_history,
+            prune_command,
+            retention_command,
+            get_retention_rules,
+            get_db_connection
+        )
+
+        # Initialize database
+        init_db()
+
+        # Clear any existing data
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM messages")
+            cursor.execute("PRAGMA auto_vacuum")
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+        archive_dir = os.path.join(self.test_dir, 'archive')
+        patcher = patch('disscli.main.ARCHIVE_DIR', archive_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Without rules nothing is pruned
+        self.assertEqual(prune_history({}), 0)
+
+        for i in range(5):
+            save_message(f"message {i}", [])
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE messages SET sent_at = ? WHERE message = 'message 0'", (time.time() - 90000,))
+
+        # The age rule takes the old message, the count rule the next oldest,
+        # a batch at a time
+        rules = {"max_age": 86400, "max_messages": 3}
+        self.assertEqual(prune_history(rules, limit=1), 1)
+        self.assertEqual(prune_history(rules, limit=1), 1)
+        self.assertEqual(prune_history(rules), 0)
+        self.assertEqual([row[0] for row in list_messages()], ["message 2", "message 3", "message 4"])
+
+        archived = []
+        for name in os.listdir(archive_dir):
+            with gzip.open(os.path.join(archive_dir, name), 'rt') as f:
+                archived.extend(json.loads(line)["message"] for line in f)
+        self.assertEqual(archived, ["message 0", "message 1"])
+
+        # Messages from before sent_at was recorded count as old
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE messages SET sent_at = NULL WHERE message = 'message 2'")
+        self.assertEqual(prune_history({"max_age": 86400}), 1)
+        self.assertEqual([row[0] for row in list_messages()], ["message 3", "message 4"])
+
+        # Freed pages go back to the filesystem
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA freelist_count")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+        # An older database is only rebuilt by an explicit prune, never by
+        # whichever command opens it first
+        old_db = os.path.join(self.test_dir, 'old_history.db')
+        with sqlite3.connect(old_db) as conn:
+            conn.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, message TEXT NOT NULL, mentions TEXT)")
+            conn.execute("INSERT INTO messages (message) VALUES ('before sent_at')")
+        conn.close()
+        with patch('disscli.main.DB_PATH', old_db), patch('builtins.print'):
+            init_db()
+            self.assertEqual(get_db_connection().execute("PRAGMA auto_vacuum").fetchone()[0], 0)
+            with patch('disscli.main.get_retention_rules', return_value={"max_age": 86400}):
+                prune_command()
+            self.assertEqual(get_db_connection().execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+            self.assertEqual(list_messages(), [])
+
+        # Rules are kept in the config file
+        with patch('builtins.print'):
+            retention_command(max_age=30 * 86400, max_messages=1000)
+        self.assertEqual(get_retention_rules(), {"max_age": 30 * 86400, "max_messages": 1000})
+        with patch('builtins.print') as mock_print:
+            retention_command(clear=True)
+            mock_print.assert_called_with("History is kept forever.")
+        self.assertEqual(get_retention_rules(), {})
+
+    def test_history_export_import(self):
+        """Test moving message history through JSONL and CSV files"""
+        # Import after environment is set up
+        from disscli.main import (
+            init_db,
+            save_message,
+            export_history,
+            import_history,
+            insert_history,
+            iter_messages,
+            search_messages,
+            get_mentioned_users,
+            get_db_connection
+        )
+
+        # Initialize database
+        init_db()
+
+        # Clear any existing data
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM messages")
+
+        save_message("Deploy done @alice", ["@alice"], "alerts")
+        save_message('Quotes "and", commas\nand newlines', [])
+
+        paths = [os.path.join(self.test_dir, name) for name in ['history.jsonl', 'history.csv.gz']]
+        with patch('builtins.print') as mock_print:
+            for path in paths:
+                export_history(path)
+                mock_print.assert_called_with(f"Exported 2 messages to '{path}'.")
+            for path in paths:
+                import_history(path)
+                mock_print.assert_called_with(f"Imported 2 messages from '{path}'.")
+
+        rows = list(iter_messages(reverse=False))
+        self.assertEqual([row[1] for row in rows], ["Deploy done @alice", 'Quotes "and", commas\nand newlines'] * 3)
+        self.assertEqual({row[4] for row in rows[::2]}, {"alerts"})
+
+        # Imported rows are indexed for search and mention counts
+        self.assertEqual(len(search_messages("deploy")), 3)
+        self.assertEqual(dict((user, count) for user, count, *_ in get_mentioned_users()), {"@alice": 3})
+
+        # Large imports go in chunks, each in its own transaction
+        count = insert_history(((f"bulk {i}", ["@bob"], None, None) for i in range(25)), chunk_size=10)
+        self.assertEqual(count, 25)
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM mentions m JOIN messages ON messages.id = m.message_id WHERE user = '@bob'")
+            self.assertEqual(cursor.fetchone()[0], 25)
+
+        # Bad records are reported instead of raising
+        bad_path = os.path.join(self.test_dir, 'bad.jsonl')
+        with open(bad_path, 'w') as f:
+            f.write('{"mentions": []}\n')
+        with patch('builtins.print') as mock_print:
+            import_history(bad_path)
+            mock_print.assert_called_with("Error importing history: record 1 has no message")
+
+    def test_config_snapshot(self):
+        """Test that config is read once per process and can live in the database"""
+        # Import after environment is set up
+        import disscli.main as cli
+
+        # Initialize database
+        cli.init_db()
+        cli.save_config({"username": "Tester"})
+        self.addCleanup(cli.save_config, {})
+
+        # Repeated loads are served from memory and can't change the cache
+        with patch('builtins.open', wraps=open) as mock_open:
+            config = cli.load_config()
+            config["username"] = "Changed"
+            self.assertEqual(cli.load_config(), {"username": "Tester"})
+            mock_open.assert_not_called()
+
+        # Another process changing the file is noticed
+        with open(cli.CONFIG_PATH, 'w') as f:
+            json.dump({"username": "Other process"}, f)
+        self.assertEqual(cli.load_config(), {"username": "Other process"})
+
+        # Writes replace the file in one step
+        with patch('disscli.main.os.replace', wraps=os.replace) as mock_replace:
+            with patch('builtins.print'):
+                cli.set_user("Tester")
+            mock_replace.assert_called_once()
+        self.assertEqual(os.listdir(os.path.dirname(cli.CONFIG_PATH)).count(os.path.basename(cli.CONFIG_PATH)), 1)
+
+        # Moving the config into the database leaves only one place to read
+        with patch('builtins.print') as mock_print:
+            cli.move_config("db")
+            mock_print.assert_called_with(f"Moved 1 configuration keys into '{cli.DB_PATH}'.")
+        self.assertFalse(os.path.exists(cli.CONFIG_PATH))
+        self.assertEqual(cli.config_store(), "db")
+        cli.reset_config_cache()
+        self.assertEqual(cli.load_config(), {"username": "Tester"})
+
+        with patch('builtins.print') as mock_print:
+            cli.set_user("Database user")
+            cli.whoami()
+            mock_print.assert_called_with("Current username: Database user")
+        self.assertFalse(os.path.exists(cli.CONFIG_PATH))
+
+        with patch('builtins.print'):
+            cli.move_config("file")
+        self.assertEqual(cli.config_store(), "file")
+        with open(cli.CONFIG_PATH) as f:
+            self.assertEqual(json.load(f), {"username": "Database user"})
+
+    def test_send_from_file(self):
+        """Test sending a JSONL file of messages in bulk"""
+        # Import after environment is set up
+        from disscli.main import (
+            init_db,
+            add_hook,
+            send_from_file,
+            iter_messages,
+            get_db_connection
+        )
+
+        # Initialize database
+        init_db()
+
+        # Clear any existing data
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM messages")
+            cursor.execute("DELETE FROM hooks")
+            cursor.execute("DELETE FROM outbox")
+
+        with patch('builtins.print'):
+            add_hook("reports", "http://reports.webhook.url")
+            add_hook("alerts", "http://alerts.webhook.url")
+
+        path = os.path.join(self.test_dir, 'messages.jsonl')
+        with open(path, 'w') as f:
+            for i in range(3):
+                f.write(json.dumps({"hook": "alerts", "content": f"alert {i}", "username": "Monitor"}) + "\n")
+            f.write(json.dumps({"content": "to the default hook"}) + "\n")
+            f.write("\n")
+            f.write(json.dumps({"hook": "missing", "content": "nowhere"}) + "\n")
+            f.write(json.dumps({"hook": "alerts", "content": ""}) + "\n")
+            f.write("not json\n")
+            f.write(json.dumps({"hook": ["alerts"], "content": "hi"}) + "\n")
+            f.write(json.dumps({"hook": "alerts", "content": "hi", "username": {"a": 1}}) + "\n")
+            f.write(json.dumps({"hook": "alerts", "content": "hi", "avatar_url": 5}) + "\n")
+
+        # A dry run only validates
+        with patch('requests.Session.post') as mock_post, patch('builtins.print') as mock_print:
+            send_from_file(path, dry_run=True)
+            mock_post.assert_not_called()
+            mock_print.assert_any_call("4 records are ready to send.")
+
+        with patch('requests.Session.post') as mock_post, patch('builtins.print') as mock_print:
+            mock_post.return_value.status_code = 204
+            mock_post.return_value.headers = {}
+            send_from_file(path, concurrency=2)
+
+        printed = [c.args[0] for c in mock_print.call_args_list]
+        self.assertTrue(printed[0].startswith("Sent 4/4 messages in "))
+        self.assertEqual(printed[1:], [
+            "Skipped 6 invalid records:",
+            "  line 6: unknown hook 'missing'",
+            "  line 7: 'content' must be a non-empty string",
+            "  line 8: Expecting value: line 1 column 1 (char 0)",
+            "  line 9: 'hook' must be a string",
+            "  line 10: 'username' must be a string",
+            "  ... and 1 more",
+        ])
+
+        posts = [(c.args[0], c.kwargs["json"]["content"], c.kwargs["json"]["username"]) for c in mock_post.call_args_list]
+        self.assertEqual([p for p in posts if p[0] == "http://alerts.webhook.url"],
+                         [("http://alerts.webhook.url", f"alert {i}", "Monitor") for i in range(3)])
+        self.assertIn("to the default hook", [p[1] for p in posts if p[0] == "http://reports.webhook.url"])
+        self.assertEqual(len(list(iter_messages())), 4)
+
+    def test_hook_groups(self):
+        """Test tagging hooks and sending to a group"""
+        # Import after environment is set up
+        from disscli.main import (
+            init_db,
+            add_hook,
+            delete_hook,
+            tag_hook,
+            untag_hook,
+            list_groups,
+            get_group_webhooks,
+            send_to_group,
+            get_db_connection
+        )
+
+        # Initialize database
+        init_db()
+
+        # Clear any existing data
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM hooks")
+            cursor.execute("DELETE FROM hook_groups")
+            cursor.execute("DELETE FROM outbox")
+
+        with patch('builtins.print') as mock_print:
+            for name in ["ops", "dev", "sales"]:
+                add_hook(name, f"http://{name}.webhook.url")
+            tag_hook("ops", ["oncall", "eng"])
+            mock_print.assert_called_with("Hook 'ops' added to 'oncall', 'eng'.")
+            tag_hook("dev", ["oncall"])
+            tag_hook("missing", ["oncall"])
+            mock_print.assert_called_with("Error: No hook found with the name 'missing'.")
+            list_groups()
+            mock_print.assert_has_calls([call("eng: ops"), call("oncall: dev, ops")])
+
+        # Members are found through the primary key index
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("EXPLAIN QUERY PLAN SELECT hook_name FROM hook_groups WHERE group_name = 'oncall'")
+            self.assertIn("USING COVERING INDEX", " ".join(row[3] for row in cursor.fetchall()))
+
+        with patch('requests.Session.post') as mock_post, patch('builtins.print') as mock_print:
+            mock_post.return_value.status_code = 204
+            mock_post.return_value.headers = {}
+            send_to_group("oncall", "Disk full", "test_user")
+            mock_print.assert_any_call("Message sent to 2/2 webhooks in group 'oncall'.")
+        self.assertEqual(sorted(c.args[0] for c in mock_post.call_args_list),
+                         ["http://dev.webhook.url", "http://ops.webhook.url"])
+
+        # Deleting or untagging a hook takes it out of its groups
+        with patch('builtins.print') as mock_print:
+            delete_hook("dev")
+            untag_hook("ops", ["eng"])
+            mock_print.assert_called_with("Hook 'ops' removed from 1 groups.")
+            send_to_group("eng", "Hello", "test_user")
+            mock_print.assert_called_with("Error: No hooks in group 'eng'. Use 'diss tag <hook> eng' to add some.")
+        self.assertEqual(get_group_webhooks("oncall"), [("http://ops.webhook.url",)])
+
+    def test_async_client(self):
+        """Test the asyncio client API"""
+        # Import after environment is set up
+        import asyncio
+        from disscli.client import AsyncWebhookClient
+        from disscli.main import (
+            init_db,
+            add_hook,
+            tag_hook,
+            iter_messages,
+            get_db_connection
+        )
+
+        # Initialize database
+        init_db()
+
+        # Clear any existing data
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM messages")
+            cursor.execute("DELETE FROM hooks")
+            cursor.execute("DELETE FROM hook_groups")
+
+        with patch('builtins.print'):
+            add_hook("ops", "http://ops.webhook.url")
+            add_hook("dev", "http://dev.webhook.url")
+            tag_hook("dev", ["oncall"])
+
+        def respond(url, json=None):
+            response = MagicMock()
+            response.headers = {}
+            response.status_code = 404 if "dev" in url and json["content"] == "second" else 204
+            response.text = "Unknown Webhook"
+            return response
+
+        async def scenario():
+            async with AsyncWebhookClient(concurrency=4, username="Service") as client:
+                single = await client.send("Deploy finished")
+                many = await client.send_many([
+                    {"content": "first", "hook": "dev"},
+                    {"content": "second", "hook": "dev"},
+                    {"content": "third", "hook": "ops"},
+                    {"content": "lost", "hook": "missing"},
+                    {"content": " ", "hook": "ops"},
+                ])
+                group = await client.broadcast("Paging on-call", group="oncall")
+                return single, many, group
+
+        with patch('requests.Session.post', side_effect=respond) as mock_post, patch('builtins.print') as mock_print:
+            single, many, group = asyncio.run(scenario())
+            # Nothing is printed; results carry the outcome
+            mock_print.assert_not_called()
+
+        self.assertTrue(single.ok)
+        self.assertEqual((single.hook, single.status_code), ("ops", 204))
+        self.assertEqual([result.ok for result in many], [True, False, True, False, False])
+        self.assertEqual(many[1].error, "404 Unknown Webhook")
+        self.assertEqual(many[3].error, "Unknown hook 'missing'")
+        self.assertEqual(many[4].error, "Cannot send empty message")
+        self.assertEqual([(result.hook, result.ok) for result in group], [("dev", True)])
+
+        # Each webhook received its messages in order, with the client's username
+        dev_posts = [c.kwargs["json"]["content"] for c in mock_post.call_args_list if c.args[0] == "http://dev.webhook.url"]
+        self.assertEqual(dev_posts, ["first", "second", "Paging on-call"])
+        self.assertEqual({c.kwargs["json"]["username"] for c in mock_post.call_args_list}, {"Service"})
+
+        # Delivered messages are in the history under their hook
+        self.assertEqual(sorted((row[1], row[4]) for row in iter_messages()), [
+            ("Deploy finished", "ops"), ("Paging on-call", "dev"), ("first", "dev"), ("third", "ops"),
+        ])
+
+    def test_log_handler(self):
+        """Test that the logging handler batches records off the calling thread"""
+        # Import after environment is set up
+        import logging
+        import threading
+        import time
+        from disscli.loghandler import WebhookHandler
+
+        logger = logging.getLogger("disscli.test")
+        logger.propagate = False
+        self.addCleanup(setattr, logger, "propagate", True)
+
+        release = threading.Event()
+        posts = []
+
+        def slow_post(url, json=None):
+            release.wait(5)
+            posts.append(json["content"])
+            response = MagicMock()
+            response.status_code = 204
+            response.headers = {}
+            return response
+
+        spill_path = os.path.join(self.test_dir, 'overflow.log')
+        with patch('requests.Session.post', side_effect=slow_post):
+            handler = WebhookHandler(webhook_url="http://logs.webhook.url", username="Logger",
+                                     flush_interval=60, max_queue=3, spill_path=spill_path)
+            handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+            logger.addHandler(handler)
+            self.addCleanup(logger.removeHandler, handler)
+            self.addCleanup(handler.close)
+            self.addCleanup(release.set)
+
+            # Records from one interval go out as one message
+            logger.error("first")
+            logger.warning("second")
+            release.set()
+            handler.flush(5)
+            self.assertEqual(posts, ["```\nERROR first\nWARNING second\n```"])
+
+            # While the webhook is slow, logging returns at once and records
+            # beyond the queue's capacity are spilled to disk
+            release.clear()
+            logger.error("blocked")
+            handler._wake.set()
+            while handler._queue.qsize():
+                time.sleep(0.01)
+            for i in range(10):
+                logger.error(f"burst {i}")
+            self.assertEqual(handler.spilled + handler._queue.qsize(), 10)
+            release.set()
+            handler.flush(5)
+            handler.close()
+
+        with open(spill_path) as f:
+            spilled = f.read().splitlines()
+        self.assertEqual(len(spilled), handler.spilled)
+        self.assertIn(f"... {handler.spilled} log records were not sent because the queue was full "
+                      f"(written to '{spill_path}')", posts[-1])
+
+    def test_library_import_keeps_signals(self):
+        """Test that importing the client and log handler leaves SIGPIPE handling alone"""
+        import subprocess
+        import sys
+        # A fresh interpreter, importing from a worker thread as lazily
+        # configured logging would
+        script = (
+            "import signal, threading\n"
+            "before = signal.getsignal(signal.SIGPIPE)\n"
+            "errors = []\n"
+            "def load():\n"
+            "    try:\n"
+            "        import disscli.loghandler, disscli.client\n"
+            "    except Exception as e:\n"
+            "        errors.append(repr(e))\n"
+            "thread = threading.Thread(target=load)\n"
+            "thread.start()\n"
+            "thread.join()\n"
+            "print(errors or signal.getsignal(signal.SIGPIPE) == before)\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True)
+        self.assertEqual(result.stdout.strip(), "True", result.stderr)
+
+    def test_dedup_window(self):
+        """Test that repeats within a hook's dedup window are counted, not sent"""
+        # Import after environment is set up
+        from disscli.main import (
+            init_db,
+            add_hook,
+            set_dedup_window,
+            send_message,
+            broadcast_message,
+            get_db_connection
+        )
+
+        # Initialize database
+        init_db()
+
+        # Clear any existing data
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM hooks")
+            cursor.execute("DELETE FROM outbox")
+            cursor.execute("DELETE FROM dedup")
+
+        with patch('builtins.print'):
+            add_hook("alerts", "http://alerts.webhook.url")
+            add_hook("chat", "http://chat.webhook.url")
+            set_dedup_window("alerts", 60)
+
+        clock = [1000.0]
+        with patch('requests.Session.post') as mock_post, patch('builtins.print') as mock_print, \
+                patch('disscli.main.time.time', side_effect=lambda: clock[0]):
+            mock_post.return_value.status_code = 204
+            mock_post.return_value.headers = {}
+
+            self.assertTrue(send_message("http://alerts.webhook.url", "bot", None, "Disk full"))
+            for _ in range(3):
+                clock[0] += 10
+                self.assertTrue(send_message("http://alerts.webhook.url", "bot", None, "Disk full"))
+            mock_print.assert_called_with("Not sent: the same message went to this hook recently. It will be counted as a repeat.")
+            # Other messages and hooks without a window are unaffected; the
+            # next message to the hook reports the repeats held back so far
+            send_message("http://alerts.webhook.url", "bot", None, "CPU high")
+            send_message("http://chat.webhook.url", "bot", None, "Disk full")
+            send_message("http://chat.webhook.url", "bot", None, "Disk full")
+            clock[0] += 10
+            self.assertTrue(send_message("http://alerts.webhook.url", "bot", None, "Disk full"))
+
+            # Once the window has passed the message goes out with its count
+            clock[0] += 60
+            broadcast_message("Disk full", "bot")
+            clock[0] += 1
+            broadcast_message("Disk full", "bot")
+            mock_print.assert_any_call("Held back a repeat of the same message for 1 webhooks.")
+
+        posts = [(c.args[0], c.kwargs["json"]["content"]) for c in mock_post.call_args_list]
+        self.assertEqual([content for url, content in posts if "alerts" in url],
+                         ["Disk full", 'CPU high\n("Disk full" was repeated 3×)', "Disk full (repeated 1×)"])
+        # Messages whose window passed with their repeats reported are
+        # forgotten; only the last broadcast's held-back copy is left
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT message, repeats FROM dedup")
+            self.assertEqual(cursor.fetchall(), [("Disk full", 1)])
+        self.assertEqual([content for url, content in posts if "chat" in url], ["Disk full"] * 4)
+
+    def test_digest(self):
+        """Test collecting messages into one digest post per hook"""
+        # Import after environment is set up
+        from disscli.main import (
+            init_db,
+            add_hook,
+            add_to_digest,
+            flush_digests,
+            get_db_connection
+        )
+
+        # Initialize database
+        init_db()
+
+        # Clear any existing data
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM hooks")
+            cursor.execute("DELETE FROM outbox")
+            cursor.execute("DELETE FROM digests")
+
+        with patch('builtins.print'):
+            add_hook("notices", "http://notices.webhook.url")
+            add_hook("audit", "http://audit.webhook.url")
+
+        clock = [1000.0]
+        with patch('requests.Session.post') as mock_post, patch('disscli.main.time.time', side_effect=lambda: clock[0]):
+            mock_post.return_value.status_code = 204
+            mock_post.return_value.headers = {}
+
+            # The first message opens a 10 minute window that later ones join
+            self.assertEqual(add_to_digest(["http://notices.webhook.url"], "Backup done", 600), [1600.0])
+            for message in ["Disk 80%", "Backup done", "Backup done"]:
+                clock[0] += 60
+                self.assertEqual(add_to_digest(["http://notices.webhook.url"], message, 60), [1600.0])
+            add_to_digest(["http://audit.webhook.url"], "Login from a new device", 3600)
+
+            self.assertEqual(flush_digests(), 0)
+            mock_post.assert_not_called()
+
+            clock[0] = 1600.0
+            self.assertEqual(flush_digests(), 1)
+            self.assertEqual(mock_post.call_count, 1)
+            content = mock_post.call_args.kwargs["json"]["content"]
+            lines = content.split("\n")
+            self.assertTrue(lines[0].startswith("**Digest:** 4 messages, "))
+            self.assertEqual(lines[1:], ["• Backup done ×3", "• Disk 80%"])
+
+            # Nothing is sent twice, and --all sends the rest early
+            self.assertEqual(flush_digests(), 0)
+            self.assertEqual(flush_digests(ignore_window=True), 1)
+            self.assertEqual(mock_post.call_args.args[0], "http://audit.webhook.url")
+
+            # Large digests are chunked like any other message
+            add_to_digest(["http://audit.webhook.url"], "x" * 1500, 60)
+            add_to_digest(["http://audit.webhook.url"], "y" * 1500, 60)
+            mock_post.reset_mock()
+            flush_digests(ignore_window=True)
+            self.assertEqual(mock_post.call_count, 2)
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file